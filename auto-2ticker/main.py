@@ -3,19 +3,24 @@
 import json
 import os
 import time
-import threading
 import math
 import random
-import cv2
-import easyocr
 import pynput.keyboard as pkeyboard
 
 import sys
 from x11_interactor import X11WindowInteractor
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Repo root, for rs3_helpers
+from rs3_helpers.headless import check_problems, parse_args
+from rs3_helpers.input_dispatch import CRITICAL, default_interactor
+from rs3_helpers.ocr_snapshot import load_snapshot
+from rs3_helpers.run_state import RunState
+from rs3_helpers.runtime import CAPTURE, INPUT, OCR, POOL_SIZES, AsyncRuntime
+
 # Initialize global variables
-script_running = False
-script_paused = False
+run_state = RunState()
+# OCR loops run as coroutines here; capture, OCR and clicks go to its worker pools
+runtime = AsyncRuntime(run_state)
 ocr_regions = []  # List to store OCR region configurations
 config_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
 assets_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
@@ -25,8 +30,6 @@ print(f"Assets directory: {assets_dir}")
 # Create assets directory if it doesn't exist
 os.makedirs(assets_dir, exist_ok=True)
 
-# Initialize interactor
-interactor = X11WindowInteractor()
 reader = None  # EasyOCR reader instance will be initialized when needed
 
 # Helper functions
@@ -97,16 +100,6 @@ def randomize_click_position(x, y, width, height, shape='rectangle', roi_diminis
 
     return int(click_x), int(click_y)
 
-def interruptible_sleep(seconds):
-    """Sleep that can be interrupted by script_running being set to False."""
-    global script_running
-    start_time = time.time()
-    while script_running and time.time() - start_time < seconds:
-        if not script_running:
-            return False  # Sleep was interrupted
-        time.sleep(0.1)  # Short sleep to check flag frequently
-    return script_running  # Return True if script is still running, False otherwise
-
 def capture_region(interactor_instance, region=None):
     """Capture a region of the screen for OCR."""
     if region is None:
@@ -120,8 +113,14 @@ def initialize_ocr(languages=['en'], gpu=True):
     """Initialize the EasyOCR reader."""
     global reader
     if reader is None:
+        # Prebuilt snapshot (python -m rs3_helpers.ocr_snapshot) if there is a valid one
+        reader = load_snapshot(languages, gpu)
+        if reader is not None:
+            print("EasyOCR loaded from snapshot")
+            return reader
         print(f"Initializing EasyOCR with languages: {languages}, GPU: {gpu}")
-        print("This may take a few seconds for the first initialization...")
+        print("This may take a few seconds; python -m rs3_helpers.ocr_snapshot makes later starts faster.")
+        import easyocr  # Pulls in torch, so only once OCR is actually needed
         try:
             reader = easyocr.Reader(languages, gpu=gpu)
             print("EasyOCR initialized successfully")
@@ -214,8 +213,8 @@ def perform_action(action_config, interactor_instance):
     """Perform an action based on configuration."""
     action_type = action_config.get('type', 'click_region')
 
-    interactor_instance.activate()
-
+    # Activation and input go out as one request (activate is a no-op while the window has the
+    # focus), so no other window's activation can land between them
     if action_type == 'click_region':
         # Click at a random position within a region
         region = action_config.get('region', None)
@@ -226,14 +225,14 @@ def perform_action(action_config, interactor_instance):
         x, y, w, h = region
         click_x, click_y = randomize_click_position(x, y, w, h, shape='circle', roi_diminish=2)
         print(f"Clicking at random position ({click_x}, {click_y}) within region")
-        interactor_instance.click(click_x, click_y)
+        interactor_instance.run(('activate',), ('click', click_x, click_y))
         return True
 
     elif action_type == 'key':
         # Press a key
         key = action_config.get('key', None)
         if key is not None:
-            interactor_instance.send_key(key)
+            interactor_instance.run(('activate',), ('send_key', key))
             return True
 
     return False
@@ -311,6 +310,7 @@ def capture_ocr_region(region_name, interactor_instance):
         return roi
 
     # Save the image for reference
+    import cv2
     img_path = os.path.join(assets_dir, f"{region_name}.png")
     cv2.imwrite(img_path, cv2.cvtColor(img, cv2.COLOR_RGBA2RGB))
     print(f"Region preview saved to {img_path}")
@@ -564,18 +564,55 @@ def get_ocr_configuration(window_id=None):
     save_config(config_data)
     return True
 
-# OCR task
-def ocr_task(region_config, target_window_id):
-    """Monitor a region for text and perform actions when detected."""
-    global script_running, script_paused
+def select_game_windows(first_window_id):
+    """Ask how many game clients to drive and pick every further window like the first one.
+
+    All windows share this process's OCR model and matchers; each gets its
+    own input dispatcher. Returns the list of window ids.
+    """
+    window_ids = [first_window_id]
+    while True:
+        count = safe_input("How many game windows should this script drive? [1]: ").strip()
+        if not count:
+            return window_ids
+        try:
+            count = int(count)
+            if count >= 1:
+                break
+        except ValueError:
+            pass
+        print("Please enter a positive number.")
 
-    # Create a new interactor instance for this thread
-    print(f"Initializing interactor for window ID: {target_window_id}")
-    interactor_instance = X11WindowInteractor(window_id=target_window_id)
-    print(f"Interactor initialized successfully for window ID: {target_window_id}")
+    for n in range(2, count + 1):
+        print(f"\nSelect game window {n} of {count} (the same way as the first one)...")
+        try:
+            window_id = X11WindowInteractor().window_id
+        except Exception as e:
+            print(f"Could not attach to window {n}: {e}")
+            continue
+        if window_id is None or window_id in window_ids:
+            print(f"Window {n} is missing or already selected. Skipping it.")
+            continue
+        window_ids.append(window_id)
+    print(f"Driving {len(window_ids)} window(s): {', '.join(str(w) for w in window_ids)}")
+    return window_ids
+
+# Blocking parts of the OCR task, run in the runtime's pools with the pool thread's own interactor
+def capture_window_region(target_window_id, region=None):
+    return capture_region(runtime.interactor(target_window_id, CRITICAL), region)
+
+def run_action(target_window_id, action_config):
+    # Clicks go through the window's dispatcher ahead of anything else
+    return perform_action(action_config, runtime.interactor(target_window_id, CRITICAL))
+
+# OCR task (a coroutine on the runtime's event loop)
+async def ocr_task(region_config, target_window_id, window_label=None):
+    """Monitor a region for text and perform actions when detected."""
 
     # Extract region configuration
     region_name = region_config.get('name', 'unnamed')
+    if window_label:
+        region_name = f"{region_name} ({window_label})"
     region_area = region_config.get('area')
     text_patterns = region_config.get('text_patterns', [])
     action_config = region_config.get('action', {'type': 'click'})
@@ -611,13 +648,10 @@ def ocr_task(region_config, target_window_id):
         print(f"Recovery multiplier: {recovery_multiplier}x (will trigger after {recovery_multiplier}x the expected interval)")
 
     # Main OCR loop
-    while script_running:
+    while run_state.running:
         try:
             # Handle pause state
-            while script_paused:
-                if not script_running:
-                    return  # Allow stop during pause
-                time.sleep(0.1)  # Short sleep while paused
+            if not await runtime.wait_while_paused(): return  # Allow stop during pause
 
             # Check if we're in cooldown
             current_time = time.time()
@@ -632,8 +666,7 @@ def ocr_task(region_config, target_window_id):
                     print(f"Region '{region_name}': Recovery trigger activated! No action triggered for {current_time - activation_times[-1]:.2f}s (expected: {expected_interval * recovery_multiplier:.2f}s)")
                     
                     # Perform recovery action
-                    interactor_instance.activate()
-                    if perform_action(action_config, interactor_instance):
+                    if await runtime.call(INPUT, run_action, target_window_id, action_config):
                         print(f"Region '{region_name}': Recovery action performed")
                         current_time = time.time()
                         last_action_time = current_time
@@ -661,30 +694,29 @@ def ocr_task(region_config, target_window_id):
             # Capture and process the region (only when not in cooldown)
             if not action_cooldown:
                 # Capture the region
-                image = capture_region(interactor_instance, region_area)
+                image = await runtime.call(CAPTURE, capture_window_region, target_window_id, region_area)
                 if image is None:
                     print(f"Failed to capture region '{region_name}'. Retrying...")
                     error_count += 1
                     if error_count >= max_consecutive_errors:
                         print(f"Too many consecutive errors for region '{region_name}'. Taking a longer break...")
-                        if not interruptible_sleep(5): return
+                        if not await runtime.sleep(5): return
                         error_count = 0
-                    if not interruptible_sleep(1): return
+                    if not await runtime.sleep(1): return
                     continue
 
                 # Reset error count on successful capture
                 error_count = 0
 
                 # Perform OCR
-                text_found, matches = perform_ocr(image, text_patterns, confidence_threshold)
+                text_found, matches = await runtime.call(OCR, perform_ocr, image, text_patterns, confidence_threshold)
 
                 # If text is found, perform the action
                 if text_found:
                     print(f"Region '{region_name}': Text detected - {matches}")
 
                     # Perform the action
-                    interactor_instance.activate()  # Ensure window is active
-                    if perform_action(action_config, interactor_instance):
+                    if await runtime.call(INPUT, run_action, target_window_id, action_config):
                         print(f"Region '{region_name}': Action performed")
                         current_time = time.time()
                         last_action_time = current_time
@@ -710,33 +742,88 @@ def ocr_task(region_config, target_window_id):
                         print(f"Region '{region_name}': Action failed")
 
             # Sleep until next scan
-            if not interruptible_sleep(scan_frequency): return
+            if not await runtime.sleep(scan_frequency): return
 
         except Exception as loop_error:
             print(f"Error in OCR task loop for region '{region_name}': {loop_error}")
             error_count += 1
             if error_count >= max_consecutive_errors:
                 print(f"Too many consecutive errors for region '{region_name}'. Taking a longer break...")
-                if not interruptible_sleep(5): return
+                if not await runtime.sleep(5): return
                 error_count = 0
             else:
                 print("Waiting before retrying loop...")
-                if not interruptible_sleep(1): return  # Use interruptible sleep in except block
+                if not await runtime.sleep(1): return  # Use interruptible sleep in except block
 
     print(f"OCR task for region '{region_name}' finished.")
 
+def start_ocr_tasks(window_ids):
+    """Start monitoring every configured region on every window in ``window_ids``."""
+    run_state.start()
+    print("Script starting...")
+
+    # Initialize OCR engine
+    ocr_engine = initialize_ocr()
+    if ocr_engine is None:
+        print("Warning: OCR engine initialization failed. Some functionality may not work.")
+        print("Continuing anyway...")
+
+    # One coroutine per region and window, all on the runtime's event loop
+    print(f"Starting {len(ocr_regions) * len(window_ids)} OCR monitoring tasks...")
+    runtime.set_pool_size(CAPTURE, max(POOL_SIZES[CAPTURE], len(window_ids)))  # A slow client doesn't hold up the others
+    for window_id in window_ids:
+        window_label = f"window {window_id}" if len(window_ids) > 1 else None
+        for region_config in ocr_regions:
+            region_name = region_config.get('name', 'unnamed')
+            runtime.spawn(ocr_task, region_config, window_id, window_label,
+                          name=f"OCR task for region '{region_name}'" + (f" ({window_label})" if window_label else ""))
+            print(f"Started task for region '{region_name}'" + (f" on {window_label}" if window_label else ""))
+
+# Headless start (--profile/--start)
+def region_problems(config_data):
+    """What keeps the OCR regions in ``config_data`` from running as configured."""
+    problems = []
+    regions = config_data.get('regions') or []
+    if not regions:
+        problems.append("no OCR regions configured")
+    for n, region in enumerate(regions, 1):
+        name = region.get('name', f"region {n}")
+        area = region.get('area')
+        if not (isinstance(area, (list, tuple)) and len(area) == 4):
+            problems.append(f"{name}: area must be [x, y, width, height]")
+        if not region.get('text_patterns'):
+            problems.append(f"{name}: no text patterns")
+        action = region.get('action') or {}
+        action_type = action.get('type', 'click_region')
+        if action_type == 'click_region' and not action.get('region'):
+            problems.append(f"{name}: click action without a click region")
+        elif action_type == 'key' and not action.get('key'):
+            problems.append(f"{name}: key action without a key")
+        elif action_type not in ('click_region', 'key'):
+            problems.append(f"{name}: unknown action type {action_type!r}")
+    return problems
+
+def start_from_profile():
+    """Start the OCR regions of the profile on the default window, without prompts. False if unusable."""
+    global ocr_regions
+    config_data = load_config()
+    if not check_problems(region_problems(config_data), os.path.abspath(config_file)):
+        return False
+    ocr_regions = config_data['regions']
+    start_ocr_tasks([default_interactor().window_id])
+    return True
+
 # Keyboard event handler
 def on_press(key):
-    global script_running, script_paused, interactor
     try:
         # Check for F11 and F12 keys
         if key == pkeyboard.Key.f11:  # F11 key to start/pause
             # Clear the terminal line to prevent escape sequences from showing
             print("\r", end="", flush=True)
 
-            if not script_running:
+            if not run_state.running:
                 # Get the window ID first
-                target_window_id = interactor.window_id
+                target_window_id = default_interactor().window_id
 
                 # --- Configuration Step ---
                 if not get_ocr_configuration(window_id=target_window_id):
@@ -748,27 +835,15 @@ def on_press(key):
                     print("No OCR regions configured. Script not started.")
                     return
 
-                script_running = True
-                script_paused = False
-                print("Script starting...")
+                # Further clients share this process (one OCR model, one set of matchers)
+                window_ids = select_game_windows(target_window_id)
 
-                # Initialize OCR engine
-                ocr_engine = initialize_ocr()
-                if ocr_engine is None:
-                    print("Warning: OCR engine initialization failed. Some functionality may not work.")
-                    print("Continuing anyway...")
-
-                # Start OCR threads
-                print(f"Starting {len(ocr_regions)} OCR monitoring threads...")
-                for region_config in ocr_regions:
-                    thread = threading.Thread(target=ocr_task, args=(region_config, target_window_id), daemon=True)
-                    thread.start()
-                    print(f"Started thread for region '{region_config.get('name', 'unnamed')}'")
+                start_ocr_tasks(window_ids)
 
             else:
                 # --- Pause/Resume Logic ---
-                script_paused = not script_paused
-                if script_paused:
+                run_state.toggle_pause()
+                if run_state.paused:
                     print("--- Script Paused ---")
                 else:
                     print("--- Script Resumed ---")
@@ -777,11 +852,10 @@ def on_press(key):
             # Clear the terminal line to prevent escape sequences from showing
             print("\r", end="", flush=True)
 
-            if script_running:
+            if run_state.running:
                 print("--- Stopping script immediately (F12 pressed) ---")
-                script_running = False
-                script_paused = False
-                # Threads are daemons, they will exit when the main script finishes
+                run_state.stop()
+                # The runtime cancels the OCR tasks on stop
 
     except AttributeError:
         # Usually happens with special keys that don't have a 'char' attribute, safe to ignore here.
@@ -795,6 +869,7 @@ def start_listener():
     print("\nFeatures:")
     print("  - OCR-based text detection")
     print("  - Multiple monitoring regions")
+    print("  - Several game windows from one process")
     print("  - Customizable actions (clicks or key presses)")
     print("  - Adjustable timing and sensitivity")
     print("  - Recovery mechanism for missed OCR conditions")
@@ -817,5 +892,11 @@ if __name__ == "__main__":
     # Create assets directory if it doesn't exist
     os.makedirs(assets_dir, exist_ok=True)
 
+    args = parse_args("2-tick helper: F11 configures and starts, or --start runs a saved profile.")
+    if args.profile:
+        config_file = os.path.abspath(args.profile)
+    if args.start and not start_from_profile():
+        sys.exit(1)
+
     # Start the listener
     start_listener()
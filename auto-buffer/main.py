@@ -3,18 +3,27 @@
 import json
 import os
 import time
-import threading
 import random
 import pynput.keyboard as pkeyboard
 import cv2
 
 import sys
 from x11_interactor import X11WindowInteractor
-from template_matching import ColorMatcher
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Repo root, for rs3_helpers
+from rs3_helpers.scale_search import make_scales
+from rs3_helpers.template_pyramid import build_pyramid
+from rs3_helpers.cascade import print_cascade_stats
+from rs3_helpers.headless import check_problems, parse_args
+from rs3_helpers.input_dispatch import BUFF, default_interactor
+from rs3_helpers.run_state import RunState
+from rs3_helpers.runtime import INPUT, MATCH, AsyncRuntime
+from rs3_helpers.vision import find_image, get_matcher
 
 # Initialize global variables
-script_running = False
-script_paused = False
+run_state = RunState()
+# Buff loops run as coroutines here; capture, matching and input go to its worker pools
+runtime = AsyncRuntime(run_state)
 buffs = []  # List to store buff configurations
 
 # Get absolute path to the config file and assets directory
@@ -27,56 +36,7 @@ print(f"Assets directory: {assets_dir}")
 # Create assets directory if it doesn't exist
 os.makedirs(assets_dir, exist_ok=True)
 
-# Initialize interactor and template matcher
-interactor = X11WindowInteractor()
-matcher = ColorMatcher(num_scales=150, min_scale=0.5, max_scale=2.0, match_threshold=0.60)
-
-# Dictionary to store template scales for faster matching
-template_scales = {}
-
 # Helper functions
-def interruptible_sleep(seconds):
-    """Sleep that can be interrupted by script_running being set to False."""
-    global script_running
-    start_time = time.time()
-    while script_running and time.time() - start_time < seconds:
-        if not script_running:
-            return False  # Sleep was interrupted
-        time.sleep(0.1)  # Short sleep to check flag frequently
-    return script_running  # Return True if script is still running, False otherwise
-
-def find_image(template_path, screenshot, scale=None):
-    """Find a template image in a screenshot using template matching."""
-    global template_scales, matcher
-
-    if not os.path.exists(template_path):
-        print(f"Error: Template image not found at {template_path}")
-        return None, None, None, None, "Template not found"
-
-    if template_path in template_scales:
-        result_img, bbox, scale, correlation, status = matcher.match(
-            template_input=template_path,
-            target_input=screenshot,
-            scale=template_scales[template_path]
-        )
-    elif scale:
-        result_img, bbox, scale, correlation, status = matcher.match(
-            template_input=template_path,
-            target_input=screenshot,
-            scale=scale
-        )
-        if status == 'Detected':
-            template_scales[template_path] = scale
-    else:
-        result_img, bbox, scale, correlation, status = matcher.match(
-            template_input=template_path,
-            target_input=screenshot
-        )
-        if status == 'Detected':
-            template_scales[template_path] = scale
-
-    return result_img, bbox, scale, correlation, status
-
 def capture_buff_image(buff_name, interactor_instance):
     """Capture and save an image of a buff icon."""
     print(f"\nCapturing image for buff '{buff_name}'")
@@ -102,6 +62,8 @@ def capture_buff_image(buff_name, interactor_instance):
     img_rgb = cv2.cvtColor(img, cv2.COLOR_RGBA2RGB)
     cv2.imwrite(img_path, img_rgb)
     print(f"Buff image saved to {img_path} (RGB format)")
+    # Pre-resize the new template so the first search for it doesn't have to
+    build_pyramid(img_path, make_scales())
 
     return img_path
 
@@ -170,7 +132,7 @@ def verify_buff_active(template_path, interactor_instance, buff_bar_roi=None):
         return False
 
     # Find the buff icon in the screenshot
-    _, bbox, _, correlation, status = find_image(template_path, screenshot)
+    _, bbox, _, correlation, status = find_image(template_path, screenshot, get_matcher('lenient'), first_hit=True)
 
     if status == 'Detected' and bbox is not None:
         print(f"Buff detected with correlation {correlation:.2f}")
@@ -424,42 +386,49 @@ def get_buff_configuration(window_id=None):
     return True, buff_bar_roi
 
 # Buff activation function
-def activate_buff(key, buff_type, use_template, template_path, buff_bar_roi, interactor_instance):
+def send_buff_key(target_window_id, key):
+    """Activate the window and press the buff key (blocking, runs in the runtime's input pool)."""
+    interactor_instance = runtime.interactor(target_window_id, BUFF)
+    interactor_instance.activate()
+    interactor_instance.send_key(key)
+
+def check_buff_active(target_window_id, template_path, buff_bar_roi):
+    """verify_buff_active with the calling pool thread's interactor."""
+    return verify_buff_active(template_path, runtime.interactor(target_window_id, BUFF), buff_bar_roi)
+
+async def activate_buff(key, buff_type, use_template, template_path, buff_bar_roi, target_window_id):
     """Activate a buff with optional verification."""
     print(f"Activating buff '{key}'...")
-    interactor_instance.activate()
 
     # For indefinite buffs, first check if it's already active
     if buff_type == 3 and use_template:
-        buff_active = verify_buff_active(template_path, interactor_instance, buff_bar_roi)
+        buff_active = await runtime.call(MATCH, check_buff_active, target_window_id, template_path, buff_bar_roi)
         if buff_active:
             print(f"Buff '{key}' is already active. No need to activate.")
             return True
 
     # Activate the buff
     attempt = 0
-    while script_running and not script_paused:
-        interactor_instance.activate()
-        if not interruptible_sleep(0.1): return False
-        interactor_instance.send_key(key)
+    while run_state.running and not run_state.paused:
+        await runtime.call(INPUT, send_buff_key, target_window_id, key)
         if buff_type == 2:
             print(f"Waiting for buff '{key}' to activate...")
-            if not interruptible_sleep(5): return False
+            if not await runtime.sleep(5): return False
         if buff_type == 3:
             print(f"Waiting for buff '{key}' to activate...")
-            if not interruptible_sleep(1.5): return False
+            if not await runtime.sleep(1.5): return False
 
         # Verify activation if using template
         if use_template:
             print(f"Verifying buff activation (attempt {attempt+1})...")
-            buff_active = verify_buff_active(template_path, interactor_instance, buff_bar_roi)
+            buff_active = await runtime.call(MATCH, check_buff_active, target_window_id, template_path, buff_bar_roi)
 
             if buff_active:
                 print(f"Buff '{key}' successfully activated!")
                 return True
             else:
                 print(f"Buff '{key}' not detected. Trying again...")
-                if not interruptible_sleep(random.uniform(1.0, 1.5)): return False
+                if not await runtime.sleep(random.uniform(1.0, 1.5)): return False
         else:
             # If not using template, assume activation was successful
             return True
@@ -471,12 +440,8 @@ def activate_buff(key, buff_type, use_template, template_path, buff_bar_roi, int
             print(f"Continuing with scheduled activations...")
             return False
 
-# Buff activation task
-def buff_task(buff_config, target_window_id, buff_bar_roi=None):
-    global script_running, script_paused
-
-    interactor_instance = X11WindowInteractor(window_id=target_window_id)
-
+# Buff activation task (a coroutine on the runtime's event loop)
+async def buff_task(buff_config, target_window_id, buff_bar_roi=None):
     # Extract buff configuration
     key = buff_config['key']
     buff_type = buff_config.get('buff_type', 1)  # Default to type 1 if not specified
@@ -516,8 +481,8 @@ def buff_task(buff_config, target_window_id, buff_bar_roi=None):
         print(f"Buff '{key}': Initial wait set. Next activation around {time.strftime('%H:%M:%S', time.localtime(target_expiry_time))}")
     else:
         # Activate immediately if script is running and not paused
-        if script_running and not script_paused:
-            activate_buff(key, buff_type, use_template, template_path, buff_bar_roi, interactor_instance)
+        if run_state.running and not run_state.paused:
+            await activate_buff(key, buff_type, use_template, template_path, buff_bar_roi, target_window_id)
 
             # For duration-based buffs, set the next activation time
             if buff_type in [1, 2]:  # Basic or Fixed Duration
@@ -528,12 +493,10 @@ def buff_task(buff_config, target_window_id, buff_bar_roi=None):
                 print(f"Buff '{key}': Next activation scheduled around {time.strftime('%H:%M:%S', time.localtime(target_expiry_time))}{subtract_msg}")
 
     # Main buff loop
-    while script_running:
+    while run_state.running:
         try:
             # Handle pause state
-            while script_paused:
-                if not script_running: return  # Allow stop during pause
-                time.sleep(0.1)  # Short sleep while paused
+            if not await runtime.wait_while_paused(): return  # Allow stop during pause
 
             current_time = time.time()
 
@@ -541,10 +504,9 @@ def buff_task(buff_config, target_window_id, buff_bar_roi=None):
             if buff_type == 1:  # Basic Key-Only Buff
                 # Check if it's time to activate
                 if current_time >= target_expiry_time:
-                    if script_running:
-                        interactor_instance.activate()
-                        interactor_instance.send_key(key)
-                        if not interruptible_sleep(random.uniform(0.6, 0.8)): return
+                    if run_state.running:
+                        await runtime.call(INPUT, send_buff_key, target_window_id, key)
+                        if not await runtime.sleep(random.uniform(0.6, 0.8)): return
 
                         # Set next activation time
                         random_subtract = random.uniform(5, 10) if duration > 15 else 0
@@ -557,13 +519,13 @@ def buff_task(buff_config, target_window_id, buff_bar_roi=None):
                 else:
                     # Not time yet, sleep for a bit
                     sleep_time = min(5.0, target_expiry_time - current_time)
-                    if not interruptible_sleep(sleep_time): return
+                    if not await runtime.sleep(sleep_time): return
 
             elif buff_type == 2:  # Fixed Duration Image-Based Buff
                 # Check if it's time to activate
                 if current_time >= target_expiry_time:
-                    if script_running:
-                        activate_buff(key, buff_type, use_template, template_path, buff_bar_roi, interactor_instance)
+                    if run_state.running:
+                        await activate_buff(key, buff_type, use_template, template_path, buff_bar_roi, target_window_id)
 
                         # Set next activation time
                         random_subtract = random.uniform(5, 10) if duration > 15 else 0
@@ -576,38 +538,77 @@ def buff_task(buff_config, target_window_id, buff_bar_roi=None):
                 else:
                     # Not time yet, sleep for a bit
                     sleep_time = min(5.0, target_expiry_time - current_time)
-                    if not interruptible_sleep(sleep_time): return
+                    if not await runtime.sleep(sleep_time): return
 
             elif buff_type == 3:  # Indefinite Image-Based Buff
                 # Check if buff is active
-                buff_active = verify_buff_active(template_path, interactor_instance, buff_bar_roi)
+                buff_active = await runtime.call(MATCH, check_buff_active, target_window_id, template_path, buff_bar_roi)
 
                 if not buff_active:
                     print(f"Buff '{key}' is not active. Activating now...")
-                    activate_buff(key, buff_type, use_template, template_path, buff_bar_roi, interactor_instance)
+                    await activate_buff(key, buff_type, use_template, template_path, buff_bar_roi, target_window_id)
 
                 # Sleep briefly before checking again
-                if not interruptible_sleep(random.uniform(2.0, 3.0)): return
+                if not await runtime.sleep(random.uniform(2.0, 3.0)): return
 
         except Exception as e:
             print(f"Error in buff task for key '{key}': {e}")
             print("Waiting before retrying loop...")
-            if not interruptible_sleep(5): return  # Use interruptible sleep in except block
+            if not await runtime.sleep(5): return  # Use interruptible sleep in except block
 
     print(f"Buff task for key '{key}' finished.")
 
+def start_buffs(target_window_id, buff_bar_roi):
+    """Start a buff task for every configured buff."""
+    run_state.start()
+    print("Script starting...")
+
+    # One coroutine per buff, all on the runtime's event loop
+    for buff_config in buffs:
+        runtime.spawn(buff_task, buff_config, target_window_id, buff_bar_roi, name=f"Buff task '{buff_config['key']}'")
+
+# Headless start (--profile/--start)
+def buff_problems(config_data):
+    """What keeps the buffs in ``config_data`` from running as configured."""
+    problems = []
+    configured = config_data.get('buffs') or []
+    if not configured:
+        problems.append("no buffs configured")
+    for n, buff in enumerate(configured, 1):
+        if not buff.get('key'):
+            problems.append(f"buff {n}: no key")
+        buff_type = buff.get('buff_type', 1)
+        if buff_type not in (1, 2, 3):
+            problems.append(f"buff {n}: unknown buff type {buff_type!r}")
+        if buff_type in (1, 2) and not buff.get('duration', 0) > 0:
+            problems.append(f"buff {n}: duration must be greater than 0")
+        if buff.get('use_template') and not os.path.exists(buff.get('template_path') or ''):
+            problems.append(f"buff {n}: template image {buff.get('template_path')} is missing")
+    if any(buff.get('use_template') for buff in configured) and not config_data.get('buff_bar_roi'):
+        problems.append("image-based buffs need the buff bar region (buff_bar_roi)")
+    return problems
+
+def start_from_profile():
+    """Start the buffs of the profile without prompts. False if the profile can't be used."""
+    global buffs
+    config_data = load_config()
+    if not check_problems(buff_problems(config_data), os.path.abspath(config_file)):
+        return False
+    buffs = config_data['buffs']
+    start_buffs(default_interactor().window_id, config_data.get('buff_bar_roi'))
+    return True
+
 # Keyboard event handler
 def on_press(key):
-    global script_running, script_paused, interactor
     try:
         # Check for F11 and F12 keys
         if key == pkeyboard.Key.f11:  # F11 key to start/pause
             # Clear the terminal line to prevent escape sequences from showing
             print("\r", end="", flush=True)
 
-            if not script_running:
+            if not run_state.running:
                 # Get the window ID first
-                target_window_id = interactor.window_id
+                target_window_id = default_interactor().window_id
 
                 # --- Configuration Step ---
                 config_result = get_buff_configuration(window_id=target_window_id)
@@ -618,18 +619,12 @@ def on_press(key):
                 # Unpack configuration result
                 _, buff_bar_roi = config_result if isinstance(config_result, tuple) and len(config_result) > 1 else (True, None)
 
-                script_running = True
-                script_paused = False
-                print("Script starting...")
-
-                # Start buff threads
-                for buff_config in buffs:
-                    threading.Thread(target=buff_task, args=(buff_config, target_window_id, buff_bar_roi), daemon=True).start()
+                start_buffs(target_window_id, buff_bar_roi)
 
             else:
                 # --- Pause/Resume Logic ---
-                script_paused = not script_paused
-                if script_paused:
+                run_state.toggle_pause()
+                if run_state.paused:
                     print("--- Script Paused ---")
                 else:
                     print("--- Script Resumed ---")
@@ -638,11 +633,11 @@ def on_press(key):
             # Clear the terminal line to prevent escape sequences from showing
             print("\r", end="", flush=True)
 
-            if script_running:
+            if run_state.running:
                 print("--- Stopping script immediately (F12 pressed) ---")
-                script_running = False
-                script_paused = False
-                # Threads are daemons, they will exit when the main script finishes
+                run_state.stop()
+                print_cascade_stats()
+                # The runtime cancels the buff tasks on stop
 
     except AttributeError:
         # Usually happens with special keys that don't have a 'char' attribute, safe to ignore here.
@@ -683,4 +678,9 @@ def start_listener():
         listener.join()
 
 if __name__ == "__main__":
+    args = parse_args("Buff helper: F11 configures and starts, or --start runs a saved profile.")
+    if args.profile:
+        config_file = os.path.abspath(args.profile)
+    if args.start and not start_from_profile():
+        sys.exit(1)
     start_listener()
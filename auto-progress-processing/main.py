@@ -8,32 +8,31 @@ import math
 import random
 import pynput.keyboard as pkeyboard
 import json
+import hashlib
 from collections import Counter, deque
-from IPython.display import clear_output
 import cv2 # Added for progress bar functions
 
 import sys, os
 from x11_interactor import X11WindowInteractor
-from template_matching import ColorMatcher
 
-# Initialize mouse and keyboard controllers globally
-interactor = X11WindowInteractor()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Repo root, for rs3_helpers
+from rs3_helpers.cascade import print_cascade_stats
+from rs3_helpers.headless import check_problems, load_json, missing_rois, parse_args
+from rs3_helpers.input_dispatch import BUFF, CRAFTING, default_interactor, dispatched_interactor
+from rs3_helpers.phases import BANKING, IDLE, PROCESSING, SETUP, PhaseBus
+from rs3_helpers.run_state import RunState
+from rs3_helpers.scheduler import BuffJob, BuffScheduler
+from rs3_helpers.vision import find_image, get_matcher
 
-# Matchers
-aggressive_matcher = ColorMatcher(num_scales=150, min_scale=0.5, max_scale=2.0, match_threshold=0.90)
-lineant_matcher = ColorMatcher(num_scales=150, min_scale=0.5, max_scale=2.0, match_threshold=0.60)
-
-# Global variable to control the start and stop of the script
-script_running = False
-script_paused = False
+# Start/stop/pause state of the script; threads block on it instead of polling
+run_state = RunState()
 
 # --- Buff Management Globals ---
 auto_buff_management = False
 initial_torstol_wait = 0 # Seconds
 initial_attraction_wait = 0 # Seconds
-last_torstol_activation_time = None
-last_attraction_activation_time = None
-in_processing_loop = False  # Flag to track when we're in the main processing function loop
+buff_scheduler = None # Timer thread activating torstol/attraction (created on start)
+phase_bus = PhaseBus()  # process_single_item()/banking announce their phase here
 # --- End Buff Management Globals ---
 
 # --- Generic Crafting Globals ---
@@ -44,11 +43,13 @@ progress_bar_debug_mode = False
 PROGRESS_CHECK_FREQUENCY = 0.3 # Seconds, for both normal and debug mode tracking. Default
 dynamically_selected_item_roi = None # New: Stores the single ROI selected at script start if item selection is on
 completed_progress_colors = [] # Populated by load_progress_bar_reference
+PIXEL_MATCH_TOLERANCE = 10 # How close (per channel, exclusive) a pixel needs to be to a 'completed' color
+completed_colors_lut = None # Packed 2^24-bit table of 'completed' RGB colors, built by load_progress_bar_reference
+PROGRESS_READER_MODE = 'full' # 'full': classify the whole ROI; 'scanline': a few rows only (not yet checked against real captures)
+SCANLINE_ROW_COUNT = 2 # Rows sampled in scanline mode
+progress_scanline_rows = [] # Sampled rows as fractions of the bar height, chosen from the reference image
 # --- End Generic Crafting Globals ---
 
-# Stores scales for all template matches
-template_scales = {}
-
 # Default ROIs (will be overridden by config.json if it exists)
 # Generic ROIs - users will calibrate these
 default_rois = {
@@ -64,6 +65,12 @@ default_rois = {
 script_dir = os.path.dirname(os.path.abspath(__file__))
 config_file = os.path.join(script_dir, 'config.json')
 
+# Command line first: the settings below are loaded from --profile, never from (or into) config.json
+args = parse_args("Progress-based crafting helper: F11 configures and starts, or --start runs a saved profile and queue.",
+                  queue=True) if __name__ == "__main__" else None
+if args and args.profile:
+    config_file = os.path.abspath(args.profile)
+
 RECALIBRATE = False
 
 # TEMPLATES
@@ -84,6 +91,29 @@ crafting_queue = deque() # Stores task labels
 # --- End Data Structures ---
 
 
+def extra_progress_bars(config_data, problems):
+    """Extra bars of ``config_data`` as name -> (roi, reference path). Malformed entries are left out and described in ``problems``.
+
+    Extra bars go under "progress_bars": {"<name>": {"roi": [x, y, w, h],
+    "reference": "assets/<name>_reference.png"}}, reference relative to this script.
+    """
+    entries = config_data.get('progress_bars', {})
+    if not isinstance(entries, dict):
+        problems.append("'progress_bars' must map bar names to {\"roi\": [x, y, w, h], \"reference\": path}")
+        return {}
+    bars = {}
+    for name, bar_config in entries.items():
+        bar_config = bar_config if isinstance(bar_config, dict) else {}
+        roi, reference = bar_config.get('roi'), bar_config.get('reference')
+        if not isinstance(roi, (list, tuple)) or len(roi) != 4 or not all(isinstance(v, int) for v in roi):
+            problems.append(f"progress bar '{name}' needs \"roi\": [x, y, w, h]")
+        elif not isinstance(reference, str) or not reference:
+            problems.append(f"progress bar '{name}' needs a \"reference\" image path")
+        else:
+            bars[name] = (tuple(roi), os.path.join(script_dir, reference))
+    return bars
+
+
 # Configuration functions
 def load_config():
     abs_config_file = os.path.abspath(config_file)
@@ -92,6 +122,10 @@ def load_config():
             with open(abs_config_file, 'r') as f:
                 config_data = json.load(f)
             print(f"Loaded configuration with {len(config_data.get('rois', {}))} ROIs")
+            bar_problems = []
+            extra_progress_bars(config_data, bar_problems)
+            for problem in bar_problems:
+                print(f"Warning: {problem}; ignoring it.")
             return config_data
         except json.JSONDecodeError:
             print(f"Error: {abs_config_file} is not a valid JSON file.")
@@ -242,7 +276,7 @@ auto_buff_management = settings.get('auto_buff_management', auto_buff_management
 
 if RECALIBRATE:
     print("RECALIBRATE flag is set. Starting forced recalibration...")
-    _, config_data = get_script_configuration(window_id=interactor.window_id)
+    _, config_data = get_script_configuration(window_id=default_interactor().window_id)
     rois = config_data.get('rois', default_rois.copy())
     loaded_keybinds = config_data.get('keybinds', {})
     torstol_sticks_key = loaded_keybinds.get('torstol_sticks_key', torstol_sticks_key)
@@ -250,31 +284,6 @@ if RECALIBRATE:
     start_craft_key = loaded_keybinds.get('start_craft_key', start_craft_key)
 
 
-def find_image_flexible(template_path, screenshot, matcher_instance=aggressive_matcher, custom_scale=None):
-    global template_scales
-    if not os.path.exists(template_path):
-        print(f"Error: Template image not found at {template_path}")
-        return None, "Template not found"
-
-    # Determine scale: 1. custom_scale, 2. stored scale, 3. auto-detect
-    scale_to_use = custom_scale
-    if scale_to_use is None and template_path in template_scales:
-        scale_to_use = template_scales[template_path]
-
-    if scale_to_use is not None: # Use provided or stored scale
-        _, bbox, detected_scale, _, status = matcher_instance.match(
-            template_input=template_path, target_input=screenshot, scale=scale_to_use
-        )
-    else: # Auto-detect scale
-        _, bbox, detected_scale, _, status = matcher_instance.match(
-            template_input=template_path, target_input=screenshot
-        )
-        if status == 'Detected':
-            template_scales[template_path] = detected_scale # Store for next time
-
-    return bbox, status
-
-
 def randomize_click_position(x, y, width, height, shape='rectangle', roi_diminish=2):
     center_x, center_y = x + width // 2, y + height // 2
     if shape == 'circle':
@@ -292,19 +301,8 @@ def randomize_click_position(x, y, width, height, shape='rectangle', roi_diminis
         click_y = int(np.clip(np.random.normal(center_y, std_dev_y), top_bound, bottom_bound))
     return click_x, click_y
 
-def interruptible_sleep(duration, check_interval=0.1):
-    global script_running, script_paused
-    end_time = time.time() + duration
-    while time.time() < end_time:
-        if not script_running: return False
-        while script_paused:
-            if not script_running: return False
-            time.sleep(check_interval)
-        remaining_time = end_time - time.time()
-        sleep_this_interval = min(check_interval, remaining_time)
-        if sleep_this_interval > 0: time.sleep(sleep_this_interval)
-        else: break
-    return True
+def interruptible_sleep(duration):
+    return run_state.sleep(duration)
 
 # --- Progress Bar Functions (Integrated from crafting.py) ---
 def extract_green_variations_from_image(image_np, tolerance=10): # Takes numpy array
@@ -317,43 +315,162 @@ def extract_green_variations_from_image(image_np, tolerance=10): # Takes numpy a
         print("Warning: Progress bar reference image has unexpected channel count.")
         return []
 
-    pixels = image_rgb.reshape(-1, 3)
-    unique_colors_counts = Counter(map(tuple, pixels))
-    
-    green_variations = []
-    for color, _ in unique_colors_counts.items():
-        r_int, g_int, b_int = int(color[0]), int(color[1]), int(color[2]) # Cast to int
-        if g_int > r_int and g_int > b_int and g_int > (tolerance * 2): # Make green dominant
-            if abs(r_int - g_int) > tolerance and abs(b_int - g_int) > tolerance : # Ensure it's not too white/gray
-                green_variations.append(color) # Still store original uint8 color tuple
-    # print(f"Extracted green variations for progress bar: {green_variations}")
-    return green_variations
+    colors = np.unique(image_rgb.reshape(-1, 3), axis=0)
+    r, g, b = colors.astype(np.int16).T
+    green_dominant = (g > r) & (g > b) & (g > tolerance * 2)
+    not_gray = (np.abs(r - g) > tolerance) & (np.abs(b - g) > tolerance) # Ensure it's not too white/gray
+    # print(f"Extracted green variations for progress bar: {colors[green_dominant & not_gray]}")
+    return [tuple(color) for color in colors[green_dominant & not_gray]] # Original uint8 color tuples
+
+
+def build_color_lut(colors, tolerance=PIXEL_MATCH_TOLERANCE):
+    """Compile RGB colors and a per-channel tolerance into a packed 2^24-bit lookup table.
+
+    Bit (r << 16 | g << 8 | b) is set if that color is within tolerance of one of
+    ``colors``. 2 MiB, so classifying a frame is one gather instead of a pass per color.
+    """
+    lut = np.zeros(1 << 24, dtype=bool)
+    span = np.arange(-(tolerance - 1), tolerance)
+    for color in colors:
+        r, g, b = (np.clip(int(c) + span, 0, 255) for c in color)
+        lut[(r[:, None, None] << 16) | (g[None, :, None] << 8) | b[None, None, :]] = True
+    return np.packbits(lut, bitorder='little')
+
+
+_lut_cache = (None, None) # (colors list the table was built from, table)
+
+def get_color_lut(colors):
+    """Lookup table for ``colors``, rebuilt only when a different color list is passed."""
+    global _lut_cache
+    if colors is completed_progress_colors and completed_colors_lut is not None:
+        return completed_colors_lut
+    if _lut_cache[0] is not colors:
+        _lut_cache = (colors, build_color_lut(colors))
+    return _lut_cache[1]
+
+
+def classify_pixels(image_np, lut):
+    """Boolean (h, w) mask of the pixels whose color is set in ``lut``. Expects BGRA or BGR."""
+    if image_np.shape[2] == 4:
+        # BGRA bytes read as a little-endian uint32 are A<<24 | R<<16 | G<<8 | B
+        keys = np.ascontiguousarray(image_np).view(np.uint32)[:, :, 0] & 0xFFFFFF
+    else:
+        keys = (image_np[:, :, 2].astype(np.uint32) << 16) | (image_np[:, :, 1].astype(np.uint32) << 8) | image_np[:, :, 0]
+    return ((lut[keys >> 3] >> (keys & 7).astype(np.uint8)) & 1).astype(bool)
+
+
+def choose_scanline_rows(ref_image_np, lut, count=SCANLINE_ROW_COUNT):
+    """Pick the ``count`` adjacent rows of the reference that are most reliably 'completed'.
+
+    Returned as fractions of the reference height (row centers), so they map onto
+    a progress bar ROI of any height.  Among equally filled windows the one
+    nearest the vertical centre wins: a reference that is filled edge to edge
+    would otherwise pick the top rows, which on a real ROI are the bar's border.
+    """
+    ref_h = ref_image_np.shape[0]
+    count = max(1, min(count, ref_h))
+    row_fill = classify_pixels(ref_image_np, lut).mean(axis=1)
+    # Adjacent rows keep the captured strip as small as the sample
+    window_fill = np.convolve(row_fill, np.ones(count), mode='valid')
+    candidates = np.flatnonzero(window_fill >= window_fill.max() - 1e-9)
+    centre = (ref_h - count) / 2
+    first = int(candidates[np.argmin(np.abs(candidates - centre))])
+    return [(row + 0.5) / ref_h for row in range(first, first + count)]
+
+
+def _reference_cache_key(reference_sha1):
+    # Anything the compiled data depends on besides the image itself
+    return f"{reference_sha1}:{PIXEL_MATCH_TOLERANCE}:{SCANLINE_ROW_COUNT}:centred"
+
+
+def reference_cache_path(reference_path):
+    """Cache file next to a reference image: <name>.cache.npz."""
+    return os.path.splitext(reference_path)[0] + '.cache.npz'
+
+
+def load_reference_cache(reference_path, reference_sha1):
+    """(colors, lut, scanline rows) compiled from this reference before, or None."""
+    cache_path = reference_cache_path(reference_path)
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with np.load(cache_path) as data:
+            if str(data['key']) != _reference_cache_key(reference_sha1):
+                return None
+            colors = [tuple(color) for color in data['colors']]
+            return colors, data['lut'], [float(f) for f in data['scanline_rows']]
+    except Exception as e:
+        print(f"Ignoring unreadable progress bar reference cache: {e}")
+        return None
+
+
+def save_reference_cache(reference_path, reference_sha1, colors, lut, scanline_rows):
+    try:
+        np.savez_compressed(
+            reference_cache_path(reference_path),
+            key=np.array(_reference_cache_key(reference_sha1)),
+            colors=np.array(colors, dtype=np.uint8).reshape(-1, 3),
+            lut=lut,
+            scanline_rows=np.array(scanline_rows, dtype=np.float64),
+        )
+    except Exception as e:
+        print(f"Could not write progress bar reference cache: {e}")
+
+
+def file_sha1(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def compile_progress_reference(reference_path, reference_sha1=None):
+    """'Completed' colors, lookup table and scanline rows of a reference image, from cache if possible.
+
+    Returns (colors, lut, scanline rows); colors is empty if the image is unusable.
+    """
+    reference_sha1 = reference_sha1 or file_sha1(reference_path)
+    cached = load_reference_cache(reference_path, reference_sha1)
+    if cached is not None:
+        return cached
+
+    # Use a temporary interactor to capture the image if it's on screen, or load from file
+    # For simplicity, we'll load from file directly using cv2.imread
+    ref_image_cv = cv2.imread(reference_path)
+    if ref_image_cv is None:
+        print(f"Error: Could not load progress bar reference image from {reference_path} using OpenCV.")
+        return [], None, []
+
+    # The function extract_green_variations_from_image handles BGR to RGB conversion.
+    colors = extract_green_variations_from_image(ref_image_cv, tolerance=10) # Use a slightly higher tolerance
+    if not colors:
+        return [], None, []
+    lut = build_color_lut(colors)
+    rows = choose_scanline_rows(ref_image_cv, lut)
+    save_reference_cache(reference_path, reference_sha1, colors, lut, rows)
+    return colors, lut, rows
 
 
+_loaded_reference_sha1 = None # Hash of the reference the current colors were compiled from
+
 def load_progress_bar_reference():
-    global completed_progress_colors
+    global completed_progress_colors, completed_colors_lut, progress_scanline_rows, _loaded_reference_sha1
     if not os.path.exists(PROGRESS_BAR_REFERENCE_IMG_PATH):
         print(f"Error: Progress bar reference image not found at {PROGRESS_BAR_REFERENCE_IMG_PATH}")
         print("Please ensure the image exists and the path is correct. Progress monitoring will fail.")
         completed_progress_colors = []
         return False
     try:
-        # Use a temporary interactor to capture the image if it's on screen, or load from file
-        # For simplicity, we'll load from file directly using cv2.imread
-        ref_image_cv = cv2.imread(PROGRESS_BAR_REFERENCE_IMG_PATH)
-        if ref_image_cv is None:
-            print(f"Error: Could not load progress bar reference image from {PROGRESS_BAR_REFERENCE_IMG_PATH} using OpenCV.")
-            completed_progress_colors = []
-            return False
-        
-        # Convert BGR (OpenCV default) to RGB for consistency if needed by extract_green_variations_from_image
-        # The function extract_green_variations_from_image handles BGR to RGB conversion.
-        completed_progress_colors = extract_green_variations_from_image(ref_image_cv, tolerance=10) # Use a slightly higher tolerance
+        reference_sha1 = file_sha1(PROGRESS_BAR_REFERENCE_IMG_PATH)
+        if reference_sha1 == _loaded_reference_sha1 and completed_progress_colors:
+            return True # Already compiled from this exact image
+
+        completed_progress_colors, completed_colors_lut, progress_scanline_rows = compile_progress_reference(
+            PROGRESS_BAR_REFERENCE_IMG_PATH, reference_sha1)
         
         if not completed_progress_colors:
             print("Warning: No distinct green variations found in progress bar reference. Monitoring might be inaccurate.")
             print(f"Check {PROGRESS_BAR_REFERENCE_IMG_PATH} and ensure it shows the 'completed' state of the progress bar clearly.")
             return False
+        _loaded_reference_sha1 = reference_sha1
         print(f"Loaded progress bar reference. Detected {len(completed_progress_colors)} 'completed' colors.")
         return True
     except Exception as e:
@@ -361,17 +478,13 @@ def load_progress_bar_reference():
         completed_progress_colors = []
         return False
 
-def get_completion_percentage(progress_bar_image_np, target_colors, progress_bar_roi_config):
+def get_completion_percentage(progress_bar_image_np, target_colors, progress_bar_roi_config, lut=None):
     # progress_bar_roi_config is a tuple (x, y, w, h)
     if not target_colors or progress_bar_image_np is None:
         return 0.0
 
-    # Ensure image is RGB
-    if progress_bar_image_np.shape[2] == 4: # BGRA
-        img_rgb = cv2.cvtColor(progress_bar_image_np, cv2.COLOR_BGRA2RGB)
-    elif progress_bar_image_np.shape[2] == 3: # BGR
-        img_rgb = cv2.cvtColor(progress_bar_image_np, cv2.COLOR_BGR2RGB)
-    else: # Grayscale or other
+    # Expect BGRA or BGR
+    if progress_bar_image_np.ndim != 3 or progress_bar_image_np.shape[2] not in (3, 4): # Grayscale or other
         print("Warning: Progress bar image has unexpected channel count for get_completion_percentage.")
         return 0.0
         
@@ -388,22 +501,10 @@ def get_completion_percentage(progress_bar_image_np, target_colors, progress_bar
         print("Error: Progress bar ROI width is zero.")
         return 0.0
 
-    pixels = img_rgb.reshape(-1, 3) # Flatten to list of pixels
-    
-    # Create a mask for completed pixels
-    completed_mask = np.zeros(len(pixels), dtype=bool)
-    pixel_match_tolerance = 10 # How close a pixel color needs to be to a target color
-
-    for color in target_colors:
-        # Cast pixels and color to int16 for safe subtraction
-        diff = np.abs(pixels.astype(np.int16) - np.array(color, dtype=np.int16))
-        mask_for_this_color = np.all(diff < pixel_match_tolerance, axis=1)
-        completed_mask |= mask_for_this_color
+    # Mask of completed pixels: one table lookup per pixel, whatever the number of target colors
+    completed_mask_2d = classify_pixels(progress_bar_image_np, lut if lut is not None else get_color_lut(target_colors))
     
     try:
-        # Reshape mask to 2D (actual height and width of the captured ROI image)
-        completed_mask_2d = completed_mask.reshape(roi_h_actual, roi_w_actual)
-        
         # A column is "complete" if at least 'min_col_pixels' in it are of a target color.
         # This helps make it robust to small variations/noise in the progress bar.
         min_col_pixels_threshold = max(1, int(roi_h_actual * 0.15)) # e.g., 15% of height, or at least 1 pixel
@@ -433,35 +534,245 @@ def get_completion_percentage(progress_bar_image_np, target_colors, progress_bar
         return 0.0
 
 
-def get_progress_status(interactor_instance_local):
-    global completed_progress_colors, rois
-    
-    progress_bar_roi_key = "progress_bar"
-    if progress_bar_roi_key not in rois or not rois[progress_bar_roi_key]:
-        print("Progress bar ROI not configured.")
-        return 0.0
-        
-    current_progress_bar_roi_config = rois[progress_bar_roi_key]
-    roi_x, roi_y, roi_w, roi_h = current_progress_bar_roi_config
+def scanline_filled_columns(strip_np, rows, lut):
+    """Per column of ``strip_np``, whether the majority of the sampled ``rows`` are 'completed' there."""
+    return classify_pixels(strip_np[rows], lut).sum(axis=0) * 2 >= len(rows)
 
-    if roi_w == 0 or roi_h == 0:
-        print("Progress bar ROI has zero width or height.")
-        return 0.0
 
-    if not completed_progress_colors:
-        if not load_progress_bar_reference():
-            print("Failed to load progress bar reference colors for status check.")
-            return 0.0 
-        if not completed_progress_colors: # Check again after attempting load
-            return 0.0
-        
-    screenshot_roi_np = interactor_instance_local.capture(current_progress_bar_roi_config)
-    if screenshot_roi_np is None:
-        print("Failed to capture progress bar ROI for status check.")
+def get_scanline_percentage(strip_np, rows, lut, total_pixels_width):
+    """Completion percentage from the sampled ``rows`` of ``strip_np`` (indices into the strip).
+
+    A column is filled when the majority of the sampled rows are 'completed' there.
+    """
+    if total_pixels_width == 0:
         return 0.0
-        
-    # Pass the specific ROI config (x,y,w,h) to get_completion_percentage
-    return get_completion_percentage(screenshot_roi_np, completed_progress_colors, current_progress_bar_roi_config)
+    filled_indices = np.flatnonzero(scanline_filled_columns(strip_np, rows, lut))
+    if not filled_indices.size:
+        return 0.0
+    return min((filled_indices[-1] + 1) / total_pixels_width * 100, 100.0)
+
+
+def scanline_rows(roi_h, row_fractions=None):
+    """Indices of the sampled rows in a progress bar ROI of height ``roi_h``."""
+    if row_fractions is None:
+        row_fractions = progress_scanline_rows
+    return sorted({min(int(f * roi_h), roi_h - 1) for f in row_fractions})
+
+
+def scanline_strip(progress_bar_roi_config, row_fractions=None):
+    """Capture ROI (x, y, w, h) of the strip spanning the sampled rows, and the rows' indices in it."""
+    roi_x, roi_y, roi_w, roi_h = progress_bar_roi_config
+    rows = scanline_rows(roi_h, row_fractions)
+    top = rows[0]
+    return (roi_x, roi_y + top, roi_w, rows[-1] - top + 1), [row - top for row in rows]
+
+
+class ProgressTracker:
+    """Scanline progress reading for one crafting batch, exploiting that the fill only grows.
+
+    Uses the fill edge of get_scanline_percentage (last filled column + 1). Once an edge
+    is known, only the columns from it rightwards are classified, in one vectorised call;
+    the whole strip is still captured. If the column left of the old edge is no longer
+    filled (misread, or a new batch without reset) the whole strip is classified again.
+    reset() at the start of every batch.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.last_edge = 0
+
+    def find_edge(self, strip_np, rows, lut):
+        """Last filled column + 1 in ``strip_np`` (sampled ``rows`` only), 0 if none is filled."""
+        start = min(max(self.last_edge - 1, 0), strip_np.shape[1])
+        filled = scanline_filled_columns(strip_np[:, start:], rows, lut)
+        if start and not (filled.size and filled[0]):
+            # The fill shrank: the old edge tells nothing, classify the whole strip
+            start = 0
+            filled = scanline_filled_columns(strip_np, rows, lut)
+        filled_indices = np.flatnonzero(filled)
+        self.last_edge = start + int(filled_indices[-1]) + 1 if filled_indices.size else 0
+        return self.last_edge
+
+    def read(self, strip_np, rows, lut, total_pixels_width):
+        """Completion percentage, like get_scanline_percentage."""
+        if total_pixels_width == 0:
+            return 0.0
+        return min(self.find_edge(strip_np, rows, lut) / total_pixels_width * 100, 100.0)
+
+
+class CompletionPredictor:
+    """Predicts when a batch's progress bar will be full, so monitoring can sleep until then.
+
+    The fill rate is fitted linearly from the readings of the current batch. Until
+    there are enough of them, the duration of the previous batch of the same task
+    label is used. Durations are kept per label for the rest of the session.
+    """
+    MIN_READINGS = 3 # Readings (with progress above zero) needed to fit a rate
+    MAX_SLEEP = 15.0 # Never sleep longer than this without re-measuring
+    LEAD_FRACTION = 0.1 # Wake up this share of the remaining time before the prediction...
+    MIN_LEAD = 1.0 # ...but at least this many seconds before it
+
+    durations = {} # label -> seconds from start of monitoring to completion
+
+    def __init__(self, label, target=99.0):
+        self.label = label
+        self.target = target
+        self.start_time = time.time()
+        self.readings = [] # (seconds since start, percentage)
+
+    def add_reading(self, progress):
+        self.readings.append((time.time() - self.start_time, progress))
+
+    def predicted_completion(self):
+        """Predicted seconds since start at which the bar reaches the target, or None."""
+        rising = [(t, p) for t, p in self.readings if p > 0]
+        if len(rising) >= self.MIN_READINGS and rising[-1][1] > rising[0][1]:
+            times, values = np.array(rising).T
+            rate, offset = np.polyfit(times, values, 1)
+            if rate > 0:
+                return (self.target - offset) / rate
+        return self.durations.get(self.label)
+
+    def next_delay(self, poll_interval):
+        """Seconds to sleep before the next reading: long while far from completion, ``poll_interval`` near it."""
+        predicted = self.predicted_completion()
+        if predicted is None:
+            return poll_interval
+        remaining = predicted - (time.time() - self.start_time)
+        lead = max(self.MIN_LEAD, remaining * self.LEAD_FRACTION)
+        return min(max(poll_interval, remaining - lead), self.MAX_SLEEP)
+
+    def complete(self):
+        """Record this batch's duration for the next batch with the same label."""
+        duration = time.time() - self.start_time
+        previous = self.durations.get(self.label)
+        self.durations[self.label] = duration if previous is None else (previous + duration) / 2
+
+
+class MonitoredBar:
+    """One bar watched by ProgressMonitor: its ROI, compiled reference and incremental tracker."""
+
+    def __init__(self, name, roi, reference_path):
+        self.name = name
+        self.roi = tuple(roi)
+        self.reference_path = reference_path
+        self.colors, self.lut, self.row_fractions = compile_progress_reference(reference_path)
+        self.tracker = ProgressTracker()
+        self.last_progress = 0.0
+
+    def region(self):
+        """(capture ROI, sampled rows within it) for this bar in the current reader mode."""
+        if PROGRESS_READER_MODE == 'scanline' and self.row_fractions:
+            return scanline_strip(self.roi, self.row_fractions)
+        return self.roi, None
+
+    def read(self, region_np, rows):
+        if rows is None:
+            self.last_progress = get_completion_percentage(region_np, self.colors, self.roi, self.lut)
+        else:
+            self.last_progress = self.tracker.read(region_np, rows, self.lut, self.roi[2])
+        return self.last_progress
+
+
+class ProgressMonitor:
+    """Reads any number of named progress bars from a single capture per tick.
+
+    Each bar has its own reference colors and tracking state. Bars whose regions
+    (just the sampled rows in scanline mode) overlap or lie within GROUP_GAP pixels
+    of each other share one capture of their bounding box; bars far apart are
+    captured separately, so the capture never spans the screen between them.
+    """
+    GROUP_GAP = 16 # Regions closer than this (px) are captured together
+
+    def __init__(self):
+        self.bars = {}
+        self._lock = threading.Lock()
+
+    def add_bar(self, name, roi, reference_path):
+        """Watch (or re-configure) bar ``name``. Returns False if it can't be monitored."""
+        if not roi or roi[2] == 0 or roi[3] == 0:
+            print(f"Progress bar '{name}' has no usable ROI: {roi}")
+            return False
+        if not os.path.exists(reference_path):
+            print(f"Error: Reference image for progress bar '{name}' not found at {reference_path}")
+            return False
+        bar = MonitoredBar(name, roi, reference_path)
+        if not bar.colors:
+            print(f"Warning: No 'completed' colors found in {reference_path}. Not monitoring '{name}'.")
+            return False
+        with self._lock:
+            self.bars[name] = bar
+        print(f"Monitoring progress bar '{name}' ({len(bar.colors)} 'completed' colors).")
+        return True
+
+    def remove_bar(self, name):
+        with self._lock:
+            self.bars.pop(name, None)
+
+    def reset(self, name=None):
+        """Forget the tracking state of one bar, or all of them (e.g. when a new batch starts)."""
+        with self._lock:
+            bars = [self.bars[name]] if name in self.bars else ([] if name else list(self.bars.values()))
+        for bar in bars:
+            bar.tracker.reset()
+            bar.last_progress = 0.0
+
+    def read(self, interactor_instance_local):
+        """Percentage of every bar by name, from one capture. Empty if nothing could be read."""
+        with self._lock:
+            bars = list(self.bars.values())
+        if not bars:
+            return {}
+
+        readings = {}
+        for (left, top, right, bottom), members in self._groups([(bar, *bar.region()) for bar in bars]):
+            frame = interactor_instance_local.capture((left, top, right - left, bottom - top))
+            if frame is None:
+                print(f"Failed to capture progress bars {', '.join(bar.name for bar, _, _ in members)}.")
+                continue
+            for bar, (x, y, w, h), rows in members:
+                readings[bar.name] = bar.read(frame[y - top:y - top + h, x - left:x - left + w], rows)
+        return readings
+
+    def _groups(self, regions):
+        """Merge ``(bar, roi, rows)`` regions into ``((left, top, right, bottom), members)`` capture groups."""
+        groups = [((x, y, x + w, y + h), [region]) for region in regions for x, y, w, h in [region[1]]]
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(groups)):
+                for j in range(i + 1, len(groups)):
+                    (l1, t1, r1, b1), members1 = groups[i]
+                    (l2, t2, r2, b2), members2 = groups[j]
+                    if (l2 - r1 <= self.GROUP_GAP and l1 - r2 <= self.GROUP_GAP
+                            and t2 - b1 <= self.GROUP_GAP and t1 - b2 <= self.GROUP_GAP):
+                        groups[i] = ((min(l1, l2), min(t1, t2), max(r1, r2), max(b1, b2)), members1 + members2)
+                        del groups[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return groups
+
+
+progress_monitor = ProgressMonitor()
+
+def sync_progress_monitor():
+    """Watch the crafting bar plus the well-formed extra bars from config.json (see extra_progress_bars)."""
+    wanted = {}
+    if rois.get("progress_bar"):
+        wanted["progress_bar"] = (tuple(rois["progress_bar"]), PROGRESS_BAR_REFERENCE_IMG_PATH)
+    wanted.update(extra_progress_bars(config_data, [])) # Malformed entries were reported when the config was loaded
+
+    for name, (roi, reference_path) in wanted.items():
+        bar = progress_monitor.bars.get(name)
+        if bar is None or bar.roi != roi or bar.reference_path != reference_path:
+            progress_monitor.add_bar(name, roi, reference_path)
+    for name in list(progress_monitor.bars):
+        if name not in wanted:
+            progress_monitor.remove_bar(name)
 # --- End Progress Bar Functions ---
 
 
@@ -604,7 +915,7 @@ def configure_script_settings():
 
 # --- New Core Processing Functions ---
 def perform_banking(interactor_instance_local):
-    global script_running, rois
+    global rois
     print("Performing banking...")
     interactor_instance_local.activate()
 
@@ -644,7 +955,7 @@ def perform_banking(interactor_instance_local):
         if not interruptible_sleep(random.uniform(0.8, 1.2)): return False
         return True
 
-    bbox_preset, status_preset = find_image_flexible(LOAD_LAST_PRESET_IMG, preset_button_img_roi, lineant_matcher)
+    _, bbox_preset, _, _, status_preset = find_image(LOAD_LAST_PRESET_IMG, preset_button_img_roi, get_matcher('lenient'))
 
     if status_preset == 'Detected' and bbox_preset:
         preset_roi_x, preset_roi_y, _, _ = rois["load_preset_button"]
@@ -668,12 +979,12 @@ def perform_banking(interactor_instance_local):
 
 
 def process_single_item(item_name, interactor_instance_local):
-    global script_running, script_paused, rois, enable_item_selection, start_craft_key, in_processing_loop
+    global rois, enable_item_selection, start_craft_key
     
-    in_processing_loop = True
+    phase_bus.publish(SETUP)
     interactor_instance_local.activate()
     if not interruptible_sleep(0.2): # Short sleep after window activation
-        in_processing_loop = False; return False
+        return False
 
     # 0. Optional Crafting Station Click
     if enable_crafting_station_click:
@@ -685,7 +996,7 @@ def process_single_item(item_name, interactor_instance_local):
             click_x_cs, click_y_cs = randomize_click_position(x_cs, y_cs, w_cs, h_cs)
             interactor_instance_local.click(click_x_cs, click_y_cs)
             if not interruptible_sleep(random.uniform(1.8, 2.4)): # Wait for menu to potentially open
-                in_processing_loop = False; return False 
+                return False 
 
     # 1. Optional DYNAMIC Item Selection (uses pre-selected ROI if available)
     if enable_item_selection:
@@ -696,7 +1007,7 @@ def process_single_item(item_name, interactor_instance_local):
             interactor_instance_local.click(click_x_item, click_y_item)
             print(f"Clicked pre-selected ROI for '{item_name}'.")
             if not interruptible_sleep(random.uniform(0.8, 1.2)): 
-                in_processing_loop = False; return False
+                return False
         else:
             print(f"Warning: Item selection is enabled but no item ROI was selected at script start for task '{item_name}'. Skipping item click.")
             # Optionally, could prompt here again as a fallback, or just proceed. For now, proceed.
@@ -704,119 +1015,86 @@ def process_single_item(item_name, interactor_instance_local):
     # 2. User sets quantity (manual step) - REMOVED
     # print(f"\nAction Required: Please set the quantity for task '{item_name}' using the in-game interface.")
     # safe_input("Press Enter in this console when quantity is set to continue...")
-    # if not script_running: in_processing_loop = False; return False # Check if stopped during input
+    # if not run_state.running: return False # Check if stopped during input
 
     # 3. Initiate Crafting
     print("Initiating crafting...") # This print implies the start of the action
-    clicked_button = False
-    if "start_craft_button" in rois and rois["start_craft_button"]:
-        x_btn, y_btn, w_btn, h_btn = rois["start_craft_button"]
-        if w_btn > 0 and h_btn > 0: # Ensure ROI is valid
-            click_x_btn, click_y_btn = randomize_click_position(x_btn, y_btn, w_btn, h_btn)
-            interactor_instance_local.click(click_x_btn, click_y_btn)
-            clicked_button = True
-            print("Clicked start_craft_button ROI.")
-            if not interruptible_sleep(random.uniform(0.3, 0.5)): in_processing_loop = False; return False
+    with interactor_instance_local.exclusive():  # Start click and start key go out uninterrupted
+        clicked_button = False
+        if "start_craft_button" in rois and rois["start_craft_button"]:
+            x_btn, y_btn, w_btn, h_btn = rois["start_craft_button"]
+            if w_btn > 0 and h_btn > 0: # Ensure ROI is valid
+                click_x_btn, click_y_btn = randomize_click_position(x_btn, y_btn, w_btn, h_btn)
+                interactor_instance_local.click(click_x_btn, click_y_btn)
+                clicked_button = True
+                print("Clicked start_craft_button ROI.")
+                if not interruptible_sleep(random.uniform(0.3, 0.5)): return False
     
-    # Always try key press, either as primary or fallback/additional action
-    interactor_instance_local.send_key(start_craft_key)
-    print(f"Pressed start_craft_key: '{start_craft_key}'.")
-    if not interruptible_sleep(random.uniform(1.5, 2.0)): in_processing_loop = False; return False # Initial delay for crafting to start
+        # Always try key press, either as primary or fallback/additional action
+        interactor_instance_local.send_key(start_craft_key)
+        print(f"Pressed start_craft_key: '{start_craft_key}'.")
+    if not interruptible_sleep(random.uniform(1.5, 2.0)): return False # Initial delay for crafting to start
 
     # 4. Monitor Progress
+    phase_bus.publish(PROCESSING)
     print("Monitoring progress...")
+    sync_progress_monitor()
+    progress_monitor.reset() # New batch: the bars start empty again
+    predictor = CompletionPredictor(item_name)
     start_time = time.time()
     max_wait_time = 300 # 5 minutes max per batch, adjust as needed
     last_progress_report_time = time.time()
 
-    while script_running:
-        if not script_running: break
-        while script_paused:
-            if not script_running: break
-            time.sleep(0.1)
-        if not script_running: break
+    while run_state.running:
+        if not run_state.wait_while_paused(): break
 
-        current_progress = get_progress_status(interactor_instance_local)
+        # All watched bars from one capture; the crafting bar drives the batch
+        progress_readings = progress_monitor.read(interactor_instance_local)
+        current_progress = progress_readings.get("progress_bar", 0.0)
+        predictor.add_reading(current_progress)
         
         if time.time() - last_progress_report_time > 5: # Report every 5s
-            print(f"Progress for {item_name}: {current_progress:.2f}%")
+            other_bars = "".join(f", {name}: {value:.2f}%" for name, value in progress_readings.items() if name != "progress_bar")
+            print(f"Progress for {item_name}: {current_progress:.2f}%{other_bars}")
             last_progress_report_time = time.time()
 
         if current_progress >= 99.0:
             print(f"Crafting batch for {item_name} complete (Progress: {current_progress:.2f}%).")
+            predictor.complete()
             if not interruptible_sleep(random.uniform(1.0, 1.5)): break # Small delay after completion
-            in_processing_loop = False
             return True
 
         if time.time() - start_time > max_wait_time:
             print(f"Max wait time exceeded for {item_name}. Assuming stuck or complete.")
-            in_processing_loop = False
             return True # Or False if this should be an error
 
-        if not interruptible_sleep(PROGRESS_CHECK_FREQUENCY): break # Check progress frequently
+        # Sleep until shortly before the predicted completion, then check frequently
+        if not interruptible_sleep(predictor.next_delay(PROGRESS_CHECK_FREQUENCY)): break
 
-    in_processing_loop = False
     return False # Interrupted or failed
 # --- End New Core Processing Functions ---
 
 
-# --- Background Task Functions (Buffs - largely unchanged, check keybind vars) ---
-def torstol_task(target_window_id):
-    global script_running, script_paused, auto_buff_management, initial_torstol_wait, last_torstol_activation_time, torstol_sticks_key
-    if not auto_buff_management: return
-    interactor_instance = X11WindowInteractor(window_id=target_window_id)
-    target_expiry_time = time.time() + initial_torstol_wait if initial_torstol_wait > 0 else 0
-    
-    if initial_torstol_wait <= 0 and script_running and not script_paused:
-        print("Activating Initial Torstol Sticks...")
-        interactor_instance.send_key(torstol_sticks_key)
-        last_torstol_activation_time = time.time()
-        if not interruptible_sleep(random.uniform(0.6,0.8)): return
-        target_expiry_time = last_torstol_activation_time + random.uniform(585,595)
-
-    while script_running:
-        now = time.time()
-        if now >= target_expiry_time:
-            if script_running and not script_paused: # Check pause before action
-                print("Activating Torstol Sticks...")
-                interactor_instance.send_key(torstol_sticks_key)
-                last_torstol_activation_time = time.time()
-                if not interruptible_sleep(random.uniform(0.6,0.8)): return
-                target_expiry_time = last_torstol_activation_time + random.uniform(585,595)
-        if not interruptible_sleep(0.2): return # Main wait loop
-    print("Torstol stick thread finished.")
-
-def attraction_task(target_window_id):
-    global script_running, script_paused, auto_buff_management, initial_attraction_wait, last_attraction_activation_time, attraction_potion_key
-    if not auto_buff_management: return
-    interactor_instance = X11WindowInteractor(window_id=target_window_id)
-    target_expiry_time = time.time() + initial_attraction_wait if initial_attraction_wait > 0 else 0
-
-    if initial_attraction_wait <= 0 and script_running and not script_paused:
-        print("Activating Initial Attraction Potion...")
-        interactor_instance.send_key(attraction_potion_key)
-        last_attraction_activation_time = time.time()
-        if not interruptible_sleep(random.uniform(0.6,0.8)): return
-        target_expiry_time = last_attraction_activation_time + random.uniform(880,895)
-
-    while script_running:
-        now = time.time()
-        if now >= target_expiry_time:
-            if script_running and not script_paused:
-                print("Activating Attraction Potion...")
-                interactor_instance.send_key(attraction_potion_key)
-                last_attraction_activation_time = time.time()
-                if not interruptible_sleep(random.uniform(0.6,0.8)): return
-                target_expiry_time = last_attraction_activation_time + random.uniform(880,895)
-        if not interruptible_sleep(0.2): return
-    print("Attraction potion thread finished.")
+# --- Background Task Functions (Buffs) ---
+def start_buff_scheduler(target_window_id):
+    """Schedule torstol sticks and attraction potion on a single timer thread."""
+    global buff_scheduler
+    buff_scheduler = BuffScheduler(dispatched_interactor(target_window_id, BUFF), run_state, phase_bus)
+    # Never while the bank is open: a buff key there would hit a bank preset hotkey
+    buff_phases = (IDLE, SETUP, PROCESSING)
+    buff_scheduler.add(BuffJob("Torstol Sticks", torstol_sticks_key, (585, 595), initial_wait=initial_torstol_wait,
+                               phases=buff_phases))
+    buff_scheduler.add(BuffJob("Attraction Potion", attraction_potion_key, (880, 895), initial_wait=initial_attraction_wait,
+                               phases=buff_phases))
+    buff_scheduler.start()
 
 # --- End Background Task Functions ---
 
 
 def main_script_loop(target_window_id):
-    global script_running, script_paused, crafting_queue, enable_banking, rois # Removed superheat_form_key
-    interactor_instance = X11WindowInteractor(window_id=target_window_id)
+    global crafting_queue, enable_banking, rois # Removed superheat_form_key
+    # Input goes through the window's dispatcher, so buff keys can't cut into a click sequence
+    interactor_instance = dispatched_interactor(target_window_id, CRAFTING)
     print(f"Main script thread started (Interactor for window: {target_window_id}).")
 
     # Image-based buff check for Superheat Form has been removed.
@@ -824,58 +1102,142 @@ def main_script_loop(target_window_id):
 
     print("Processing queue...")
     batch_num = 0
-    while script_running and crafting_queue:
+    while run_state.running and crafting_queue:
         batch_num += 1
         # Handle pause state
-        while script_paused:
-            if not script_running: break
-            time.sleep(0.1)
-        if not script_running: break
+        if not run_state.wait_while_paused(): break
 
         current_item_to_process = crafting_queue[0] # Peek
         print(f"\n--- Starting Batch {batch_num} for: {current_item_to_process} ---")
         print(f"Batches remaining in queue (approx): {len(crafting_queue)}")
 
-        task_completed = process_single_item(current_item_to_process, interactor_instance)
+        try:
+            task_completed = process_single_item(current_item_to_process, interactor_instance)
+        except Exception as e:
+            # Stop everything: the buff scheduler would otherwise keep pressing keys for a dead loop
+            print(f"Error while processing {current_item_to_process}: {e}. Stopping script.")
+            run_state.stop(); break
+        finally:
+            phase_bus.publish(IDLE)  # process_single_item() returns from any phase when stopped
 
-        if not script_running: print("Script stopped during processing."); break
+        if not run_state.running: print("Script stopped during processing."); break
 
         if task_completed:
             crafting_queue.popleft() # Successfully processed one batch
             print(f"Finished batch for {current_item_to_process}.")
             if enable_banking:
-                if not script_running: break
+                if not run_state.running: break
                 print("Banking enabled, performing banking...")
-                if not perform_banking(interactor_instance):
+                phase_bus.publish(BANKING)
+                try:
+                    banked = perform_banking(interactor_instance) # Buffs are parked while in BANKING
+                finally:
+                    phase_bus.publish(IDLE)
+                if not banked:
                     print("Banking failed or was interrupted. Stopping script for safety.")
-                    script_running = False; break
+                    run_state.stop(); break
                 if not interruptible_sleep(random.uniform(1.0,1.5)): break # Pause after banking
             else: # No banking, just a short pause
                 if not interruptible_sleep(random.uniform(1.5, 2.5)): break
         else:
             print(f"Processing batch for {current_item_to_process} failed or was interrupted. Stopping script.")
-            script_running = False; break
+            run_state.stop(); break
             
-    if not crafting_queue and script_running:
+    if not crafting_queue and run_state.running:
         print("Crafting queue is empty. All tasks completed.")
-    elif not script_running:
+    elif not run_state.running:
         print("Script was stopped.")
     print("Main script loop finished.")
 
 
+def start_script(target_window_id):
+    """Start debug mode, or the processing thread (and buff scheduler) for the queued batches."""
+    run_state.start()
+    if progress_bar_debug_mode:
+        print("Starting Progress Bar Debug Mode...")
+        threading.Thread(target=debug_progress_bar, args=(target_window_id,), daemon=True).start()
+    else:
+        print("Script starting...")
+        threading.Thread(target=main_script_loop, args=(target_window_id,), daemon=True).start()
+        if auto_buff_management:
+            start_buff_scheduler(target_window_id)
+
+
+# --- Headless Start (--profile/--queue/--start) ---
+def plan_batches(plan, problems):
+    """Queue for a plan: a list of {"item": task label, "batches": count (1)}. Problems go to ``problems``."""
+    batches = []
+    if not isinstance(plan, list):
+        problems.append("the queue plan must be a list of tasks")
+        return batches
+    for n, task in enumerate(plan, 1):
+        label = task.get('item') if isinstance(task, dict) else None
+        count = task.get('batches', 1) if isinstance(task, dict) else None
+        if not isinstance(label, str) or not label.strip():
+            problems.append(f"task {n}: needs an 'item' label")
+        elif not isinstance(count, int) or count <= 0:
+            problems.append(f"task {n}: batches must be a positive whole number")
+        else:
+            batches.extend([label.strip()] * count)
+    if not batches and not problems:
+        problems.append("the queue plan is empty")
+    return batches
+
+
+def start_from_profile(queue_path):
+    """Start from the loaded profile (and the queue plan at ``queue_path``) without prompts. False if unusable.
+
+    With item selection enabled the item ROI is taken from ``rois.item`` in the
+    profile instead of being selected on screen; initial buff waits are 0.
+    """
+    global dynamically_selected_item_roi
+    problems = []
+    batches = []
+    required = ["progress_bar"]
+    if not progress_bar_debug_mode:
+        if not queue_path:
+            problems.append("--start needs a queue plan (--queue)")
+        else:
+            plan = load_json(queue_path, "Queue plan")
+            if plan is None:
+                return False
+            batches = plan_batches(plan, problems)
+        if enable_crafting_station_click: required.append("crafting_station")
+        if enable_item_selection: required.append("item")
+        if enable_banking: required.append("bank_access")
+    problems += missing_rois(rois, required)
+    extra_progress_bars(config_data, problems)
+    if not check_problems(problems, os.path.abspath(config_file)):
+        return False
+    if not load_progress_bar_reference():
+        print("Failed to load progress bar reference. Script not started.")
+        return False
+
+    dynamically_selected_item_roi = rois["item"] if enable_item_selection else None
+    crafting_queue.clear()
+    crafting_queue.extend(batches)
+    if batches:
+        print(f"Queued {len(batches)} batches from {queue_path}.")
+    target_window_id = default_interactor().window_id
+    if target_window_id is None: print("Error: Target window ID not found."); return False
+    start_script(target_window_id)
+    return True
+# --- End Headless Start ---
+
+
 def on_press_key_event(key):
     # Declare all globals that might be modified within this function or its branches
-    global script_running, script_paused, interactor, auto_buff_management, rois, config_data
+    global auto_buff_management, rois, config_data
     global enable_banking, enable_item_selection, enable_crafting_station_click, progress_bar_debug_mode, dynamically_selected_item_roi
     global start_craft_key, torstol_sticks_key, attraction_potion_key # Keybinds also reloaded
 
     try:
         if key == pkeyboard.Key.f11:  # Start/Pause
-            if not script_running:
+            if not run_state.running:
                 # --- Pre-run Configurations ---
                 if not configure_script_settings(): print("Settings configuration aborted."); return
                 
-                target_window_id = interactor.window_id
+                target_window_id = default_interactor().window_id
                 if target_window_id is None: print("Error: Target window ID not found."); return
 
                 if not load_progress_bar_reference():
@@ -892,8 +1254,7 @@ def on_press_key_event(key):
                 if enable_item_selection and not progress_bar_debug_mode:
                     print(f"\nAction Required: Please select the ROI for the item you will be processing for ALL queued batches.")
                     safe_input("Press Enter in this console when ready to select the item's ROI on screen...")
-                    # Need a temporary interactor instance if global 'interactor' isn't focused on the right window yet
-                    # However, 'interactor' should be initialized by now.
+                    # Need an interactor for the target window; the default one may not be focused on it
                     temp_interactor = X11WindowInteractor(window_id=target_window_id) # Ensure it's the correct window
                     dynamically_selected_item_roi = temp_interactor.select_roi_interactive()
                     if not dynamically_selected_item_roi:
@@ -901,30 +1262,18 @@ def on_press_key_event(key):
                         return
                     print(f"Item ROI for this session: {dynamically_selected_item_roi}")
 
-                script_running = True
-                script_paused = False
-
-                if progress_bar_debug_mode:
-                    print("Starting Progress Bar Debug Mode...")
-                    threading.Thread(target=debug_progress_bar, args=(target_window_id,), daemon=True).start()
-                else:
-                    if not get_crafting_requests(): 
-                        print("No crafting tasks. Script not started.")
-                        script_running = False # Reset flag
-                        return
-                    print("Script starting...")
-                    threading.Thread(target=main_script_loop, args=(target_window_id,), daemon=True).start()
-                    if auto_buff_management:
-                        threading.Thread(target=torstol_task, args=(target_window_id,), daemon=True).start()
-                        threading.Thread(target=attraction_task, args=(target_window_id,), daemon=True).start()
+                if not progress_bar_debug_mode and not get_crafting_requests():
+                    print("No crafting tasks. Script not started.")
+                    return
+                start_script(target_window_id)
             else: # Script is running, so toggle pause
-                script_paused = not script_paused
-                print(f"--- Script {'Paused' if script_paused else 'Resumed'} ---")
+                run_state.toggle_pause()
+                print(f"--- Script {'Paused' if run_state.paused else 'Resumed'} ---")
 
         elif key == pkeyboard.Key.f10:  # Recalibrate
-            if not script_running:
+            if not run_state.running:
                 print("--- Starting Recalibration (F10) ---")
-                target_window_id = interactor.window_id
+                target_window_id = default_interactor().window_id
                 if target_window_id is None: print("Error: Target window ID not found for recalibration."); return
                 
                 _, new_config = get_script_configuration(window_id=target_window_id)
@@ -952,10 +1301,10 @@ def on_press_key_event(key):
                 print("Cannot recalibrate while script is running. Stop (F12) first.")
 
         elif key == pkeyboard.Key.f12:  # Stop
-            if script_running:
+            if run_state.running:
                 print("--- Stopping script (F12) ---")
-                script_running = False
-                script_paused = False # Ensure it's not stuck in paused state
+                run_state.stop() # Also releases anything held by a pause
+                print_cascade_stats()
     except AttributeError:
         pass # Ignore for special keys without 'char'
 
@@ -965,6 +1314,14 @@ def start_listener():
     print("Press F11 to configure settings, queue tasks, and then start/pause the script.")
     print("Press F12 to stop the script immediately.")
     print("Ensure the target game window is active before starting/recalibrating.")
+
+    with pkeyboard.Listener(on_press=on_press_key_event) as listener_instance:
+        # The main thread waits here, drawing the debug viewer in between
+        while listener_instance.is_alive():
+            debug_viewer.pump()
+            listener_instance.join(DebugViewer.PUMP_INTERVAL)
+
+def load_startup_settings():
     # Initial load of config to populate global rois, keybinds, settings before first F11/F10
     global config_data, rois, start_craft_key, torstol_sticks_key, attraction_potion_key
     global enable_banking, enable_item_selection, auto_buff_management, enable_crafting_station_click, progress_bar_debug_mode, PROGRESS_CHECK_FREQUENCY, dynamically_selected_item_roi
@@ -985,13 +1342,71 @@ def start_listener():
     progress_bar_debug_mode = settings.get('progress_bar_debug_mode', False)
     PROGRESS_CHECK_FREQUENCY = float(settings.get('progress_check_frequency', 0.3)) # Load with default
 
+# --- New Debug Function ---
+class DebugViewer:
+    """Shows debug frames without the GUI ever stalling the measurement loop.
+
+    post() only drops the frame into a single-slot mailbox; if the previous frame
+    hasn't been drawn yet, that one is replaced (latest frame wins). Drawing happens
+    in pump(), which the main thread calls while it waits in start_listener: GUI
+    backends like Qt and Cocoa only work from the main thread.
+    """
+    DISPLAY_SCALE = 3 # The bar is only a few pixels tall; enlarge it for the overlays
+    PUMP_INTERVAL = 0.05 # Seconds between pump() calls from the main thread
+
+    def __init__(self, window_name):
+        self.window_name = window_name
+        self._slot = None
+        self._closing = False
+        self._open = False # Only touched by the main thread
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def post(self, frame, progress, fill_column, timings):
+        """Hand a frame to the viewer without waiting. ``timings``: label -> milliseconds."""
+        with self._lock:
+            if self._slot is not None:
+                self.dropped += 1
+            self._slot = (frame, progress, fill_column, timings)
+
+    def close(self):
+        """Drop any pending frame and have the main thread close the window."""
+        with self._lock:
+            self._slot = None
+            self._closing = True
+
+    def _render(self, frame, progress, fill_column, timings):
+        scale = self.DISPLAY_SCALE
+        image = cv2.resize(np.ascontiguousarray(frame[:, :, :3]), None, fx=scale, fy=scale,
+                           interpolation=cv2.INTER_NEAREST)
+        canvas = cv2.copyMakeBorder(image, 0, 40, 0, 0, cv2.BORDER_CONSTANT, value=(0, 0, 0))
+        x = int(fill_column * scale)
+        cv2.line(canvas, (x, 0), (x, image.shape[0] - 1), (0, 0, 255), 1)
+        timing_text = "  ".join(f"{label} {ms:.1f}ms" for label, ms in timings.items())
+        cv2.putText(canvas, f"{progress:.2f}%  col {fill_column}  {timing_text}  dropped {self.dropped}",
+                    (4, image.shape[0] + 26), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
+        return canvas
+
+    def pump(self):
+        """Draw the latest frame and serve the window's events. Main thread only."""
+        with self._lock:
+            slot, self._slot = self._slot, None
+            closing, self._closing = self._closing, False
+        if closing and self._open:
+            cv2.destroyWindow(self.window_name)
+            self._open = False
+        if slot is not None:
+            cv2.imshow(self.window_name, self._render(*slot))
+            self._open = True
+        if self._open:
+            cv2.waitKey(1) # Keep the window responsive even without new frames
+
+
+debug_viewer = DebugViewer("Progress Bar ROI Capture")
 
-    with pkeyboard.Listener(on_press=on_press_key_event) as listener_instance:
-        listener_instance.join()
 
-# --- New Debug Function ---
 def debug_progress_bar(target_window_id):
-    global script_running, script_paused, completed_progress_colors, rois, PROGRESS_CHECK_FREQUENCY
+    global completed_progress_colors, rois, PROGRESS_CHECK_FREQUENCY
     interactor_instance = X11WindowInteractor(window_id=target_window_id)
     print(f"Progress Bar Debug Mode Started (Interactor for window: {target_window_id}).")
     print("Continuously monitoring progress bar. Press F12 to stop.")
@@ -999,13 +1414,13 @@ def debug_progress_bar(target_window_id):
 
     if not load_progress_bar_reference(): # Ensure reference is loaded
         print("Failed to load progress bar reference. Debug mode cannot continue.")
-        script_running = False # Stop the debug mode
+        run_state.stop() # Stop the debug mode
         return
     
     progress_bar_roi_key = "progress_bar"
     if progress_bar_roi_key not in rois or not rois[progress_bar_roi_key]:
         print("Progress bar ROI not configured. Debug mode cannot continue.")
-        script_running = False
+        run_state.stop()
         return
         
     current_progress_bar_roi_config = rois[progress_bar_roi_key]
@@ -1014,26 +1429,34 @@ def debug_progress_bar(target_window_id):
     print(f"Checking frequency: {PROGRESS_CHECK_FREQUENCY} seconds.")
 
     last_printed_progress = -1 # To avoid spamming same percentage
-    cv2_window_name = "Progress Bar ROI Capture"
+    debug_viewer.dropped = 0
 
-    while script_running:
-        while script_paused:
-            if not script_running: break
-            time.sleep(0.1)
-        if not script_running: break
+    while run_state.running:
+        if not run_state.wait_while_paused(): break
 
         # Capture the ROI
+        capture_started = time.perf_counter()
         screenshot_roi_np = interactor_instance.capture(current_progress_bar_roi_config)
+        capture_ms = (time.perf_counter() - capture_started) * 1000
         
         if screenshot_roi_np is not None:
-            # Display the captured ROI
-            cv2.imshow(cv2_window_name, screenshot_roi_np)
-            cv2.waitKey(1) # IMPORTANT: Allows OpenCV to process GUI events
-
             # Calculate progress
+            classify_started = time.perf_counter()
             current_progress = get_completion_percentage(screenshot_roi_np, completed_progress_colors, current_progress_bar_roi_config)
+            classify_ms = (time.perf_counter() - classify_started) * 1000
+
+            # Display the captured ROI (never blocks; the main thread draws it)
+            fill_column = int(round(current_progress / 100 * current_progress_bar_roi_config[2]))
+            debug_viewer.post(screenshot_roi_np, current_progress, fill_column, {'capture': capture_ms, 'classify': classify_ms})
+
             if abs(current_progress - last_printed_progress) > 0.1 or (current_progress == 0.0 and last_printed_progress != 0.0) : # Print if changed significantly or is zero
-                print(f"Current Progress: {current_progress:.2f}%")
+                if progress_scanline_rows and completed_colors_lut is not None:
+                    # Same frame through the scanline reader, to compare against the full-ROI reading
+                    scanline_progress = get_scanline_percentage(screenshot_roi_np, scanline_rows(screenshot_roi_np.shape[0]),
+                                                                completed_colors_lut, current_progress_bar_roi_config[2])
+                    print(f"Current Progress: {current_progress:.2f}% (scanline: {scanline_progress:.2f}%)")
+                else:
+                    print(f"Current Progress: {current_progress:.2f}%")
                 last_printed_progress = current_progress
         else:
             print("Failed to capture progress bar ROI for debugging.")
@@ -1042,9 +1465,12 @@ def debug_progress_bar(target_window_id):
         if not interruptible_sleep(PROGRESS_CHECK_FREQUENCY): 
             break 
             
+    debug_viewer.close()
     print("Progress Bar Debug Mode Finished.")
-    cv2.destroyAllWindows() # Close the OpenCV window
 # --- End New Debug Function ---
 
 if __name__ == "__main__":
+    load_startup_settings()
+    if args.start and not start_from_profile(args.queue):
+        sys.exit(1)
     start_listener()
@@ -2,29 +2,28 @@
 
 import re
 import numpy as np
-import time
 import threading
 import math
 import random
 import pynput.keyboard as pkeyboard
 import json
 from collections import Counter, deque
-from IPython.display import clear_output
 
 import sys, os
 from x11_interactor import X11WindowInteractor
-from template_matching import ColorMatcher
 
-# Initialize mouse and keyboard controllers globally
-interactor = X11WindowInteractor()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Repo root, for rs3_helpers
+from rs3_helpers.headless import check_problems, load_json, missing_rois, parse_args
+from rs3_helpers.input_dispatch import BUFF, CRAFTING, default_interactor, dispatched_interactor
+from rs3_helpers.inventory import InventoryGrid
+from rs3_helpers.phases import ANVIL, FORGE, HEATING, IDLE, PhaseBus
+from rs3_helpers.run_state import RunState
+from rs3_helpers.scheduler import BuffJob, BuffScheduler
+from rs3_helpers.cascade import print_cascade_stats
+from rs3_helpers.vision import find_image, get_matcher
 
-# Canny matcher
-aggressive_matcher = ColorMatcher(num_scales=150, min_scale=0.5, max_scale=2.0, match_threshold=0.90)
-lineant_matcher = ColorMatcher(num_scales=150, min_scale=0.5, max_scale=2.0, match_threshold=0.60)
-
-# Global variable to control the start and stop of the script
-script_running = False
-script_paused = False
+# Start/stop/pause state of the script; threads block on it instead of polling
+run_state = RunState()
 
 # --- New Buff Management Globals ---
 # Independent buff configuration
@@ -39,22 +38,19 @@ initial_attraction_wait = 0 # Seconds
 initial_powerburst_wait = 0 # Seconds
 initial_superheat_form_wait = 0 # Seconds
 
-# Last activation times
-last_torstol_activation_time = None
-last_attraction_activation_time = None
-last_powerburst_activation_time = None
-last_superheat_form_activation_time = None
+# How long a due buff may be postponed into the next idle window of smith() (the waits on the game)
+buff_slack = 10.0 # Seconds, 0 activates buffs as soon as they are due
+
+# Timer thread activating the enabled buffs (created on start)
+buff_scheduler = None
 
 # Heating method configuration
 heating_method = "superheat_spell"  # Options: "superheat_spell" or "forge"
 forge_heating_duration = 3.0  # Duration to wait for forge heating (seconds)
 
-in_smithing_loop = False  # Flag to track when we're in the smithing function loop
+phase_bus = PhaseBus()  # smith() announces forge/anvil/heating here; gates the powerburst
 # --- End New Buff Management Globals ---
 
-# Stores scales for all template matches
-template_scales = {}
-
 # Default ROIs (will be overridden by config.json if it exists)
 forge_roi = (1173, 267, 214, 215)
 anvil_roi = (1499, 597, 77, 106)
@@ -72,12 +68,20 @@ plus_4_roi = (1844, 570, 28, 28)
 plus_5_roi = (1895, 571, 29, 24)
 burial_roi = (1947, 573, 58, 22)
 bagpack_roi = (1868, 1342, 442, 223)
+# Slot grid of the bagpack ROI (rows, columns); bars are looked up per slot instead of by a full match
+bagpack_grid = (4, 7)
 buff_roi = (1420, 1112, 420, 166)
 
 # Configuration file path
 script_dir = os.path.dirname(os.path.abspath(__file__))
 config_file = os.path.join(script_dir, 'config.json')
 
+# Command line first: the settings below are loaded from --profile, never from (or into) config.json
+args = parse_args("Smithing helper: F11 configures and starts, or --start runs a saved profile and queue.",
+                  queue=True) if __name__ == "__main__" else None
+if args and args.profile:
+    config_file = os.path.abspath(args.profile)
+
 RECALIBRATE = False
 
 # TEMPLATES
@@ -86,6 +90,8 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 bar_img = os.path.join(script_dir, 'assets/bar.png')
 superheat_form_img = os.path.join(script_dir, 'assets/superheat_form.png')
 
+bagpack_inventory = InventoryGrid(*bagpack_grid)
+
 # KEYBINDS
 superheat_spell = 'V'
 torstol_sticks = 'X'
@@ -128,7 +134,7 @@ def load_config():
     """Load configuration from config.json if it exists."""
     global ordered_tiers, heating_method, forge_heating_duration, custom_items
     global enable_torstol_sticks, enable_attraction_potion, enable_powerburst, enable_superheat_form
-    global initial_torstol_wait, initial_attraction_wait, initial_powerburst_wait, initial_superheat_form_wait
+    global initial_torstol_wait, initial_attraction_wait, initial_powerburst_wait, initial_superheat_form_wait, buff_slack
     
     # Ensure the config file path is absolute
     abs_config_file = os.path.abspath(config_file)
@@ -169,6 +175,7 @@ def load_config():
                 enable_attraction_potion = buff_config.get('enable_attraction_potion', False)
                 enable_powerburst = buff_config.get('enable_powerburst', False)
                 enable_superheat_form = buff_config.get('enable_superheat_form', False)
+                buff_slack = buff_config.get('idle_slack', 10.0)
                 
                 # Load initial durations
                 if 'initial_durations' in buff_config:
@@ -212,6 +219,7 @@ def load_config():
                     "enable_attraction_potion": False,
                     "enable_powerburst": False,
                     "enable_superheat_form": False,
+                    "idle_slack": 10.0,
                     "initial_durations": {
                         "torstol_wait": 0,
                         "attraction_wait": 0,
@@ -237,6 +245,7 @@ def load_config():
             "enable_attraction_potion": False,
             "enable_powerburst": False,
             "enable_superheat_form": False,
+            "idle_slack": 10.0,
             "initial_durations": {"torstol_wait": 0, "attraction_wait": 0, "powerburst_wait": 0, "superheat_form_wait": 0}
         }
     }
@@ -411,49 +420,54 @@ def get_smithing_configuration(window_id=None):
 
     return True, config_data
 
+def apply_rois_and_keybinds(config_data):
+    """Take ROIs and keybinds from the configuration, or the defaults where it has none."""
+    global rois
+    rois = {}
+
+    # Use ROIs from config or defaults
+    if config_data and 'rois' in config_data and config_data['rois']:
+        for key, roi in config_data['rois'].items():
+            rois[key] = roi
+        print("Using ROIs from configuration file.")
+    else:
+        # Use default ROIs
+        rois = {
+            "forge": forge_roi,
+            "anvil": anvil_roi,
+            "metal_bar": metal_bar_roi,
+            "metal_full_helm": metal_full_helm_roi,
+            "metal_platelegs": metal_platelegs_roi,
+            "metal_platebody": metal_platebody_roi,
+            "metal_boots": metal_boots_roi,
+            "metal_gauntlets": metal_gauntlets_roi,
+            "base": base_roi,
+            "plus_1": plus_1_roi,
+            "plus_2": plus_2_roi,
+            "plus_3": plus_3_roi,
+            "plus_4": plus_4_roi,
+            "plus_5": plus_5_roi,
+            "burial": burial_roi,
+            "bagpack": bagpack_roi,
+            "buff": buff_roi,
+        }
+        print("Using default ROIs.")
+
+    # Use keybinds from config or defaults
+    if config_data and 'keybinds' in config_data and config_data['keybinds']:
+        # Update global keybind variables
+        for key, value in config_data['keybinds'].items():
+            globals()[key] = value
+        print("Using keybinds from configuration file.")
+
 # Load configuration or use defaults
 config_data = load_config()
-rois = {}
-
-# Use ROIs from config or defaults
-if config_data and 'rois' in config_data and config_data['rois']:
-    for key, roi in config_data['rois'].items():
-        rois[key] = roi
-    print("Using ROIs from configuration file.")
-else:
-    # Use default ROIs
-    rois = {
-        "forge": forge_roi,
-        "anvil": anvil_roi,
-        "metal_bar": metal_bar_roi,
-        "metal_full_helm": metal_full_helm_roi,
-        "metal_platelegs": metal_platelegs_roi,
-        "metal_platebody": metal_platebody_roi,
-        "metal_boots": metal_boots_roi,
-        "metal_gauntlets": metal_gauntlets_roi,
-        "base": base_roi,
-        "plus_1": plus_1_roi,
-        "plus_2": plus_2_roi,
-        "plus_3": plus_3_roi,
-        "plus_4": plus_4_roi,
-        "plus_5": plus_5_roi,
-        "burial": burial_roi,
-        "bagpack": bagpack_roi,
-        "buff": buff_roi,
-    }
-    print("Using default ROIs.")
-
-# Use keybinds from config or defaults
-if config_data and 'keybinds' in config_data and config_data['keybinds']:
-    # Update global keybind variables
-    for key, value in config_data['keybinds'].items():
-        globals()[key] = value
-    print("Using keybinds from configuration file.")
+apply_rois_and_keybinds(config_data)
 
 # Force recalibration if requested
 if RECALIBRATE:
     print("RECALIBRATE flag is set. Starting forced recalibration...")
-    _, config_data = get_smithing_configuration(window_id=interactor.window_id)
+    _, config_data = get_smithing_configuration(window_id=default_interactor().window_id)
 
     # Update rois with new calibration data
     if config_data and 'rois' in config_data:
@@ -464,29 +478,6 @@ if RECALIBRATE:
         for key, value in config_data['keybinds'].items():
             globals()[key] = value
 
-def find_image(template_path, screenshot, matcher=aggressive_matcher, scale=None):
-    global template_scales
-    if not os.path.exists(template_path):
-        print(f"Error: Template image not found at {template_path}")
-        return None, None, None, None, "Template not found"
-
-    if template_path in template_scales:
-        result_img, bbox, scale, correlation, status = matcher.match(template_input=template_path, target_input=screenshot, scale=template_scales[template_path])
-    elif scale:
-        result_img, bbox, scale, correlation, status = matcher.match(template_input=template_path, target_input=screenshot, scale=scale)
-        if status == 'Detected':
-            template_scales[template_path] = scale
-    else:
-        result_img, bbox, scale, correlation, status = matcher.match(template_input=template_path, target_input=screenshot)
-        if status == 'Detected':
-            template_scales[template_path] = scale
-
-    # Check if bbox is None or empty before returning
-    if status != 'Detected' or bbox is None or len(bbox) != 4:
-        return None, None, None, None, status  # Return None for coordinates if not detected
-
-    return result_img, bbox, scale, correlation, status
-
 def randomize_click_position(x, y, width, height, shape='rectangle', roi_diminish=2):
     # Get the center coordinates of the ROI
     center_x = x + width // 2
@@ -521,40 +512,11 @@ def randomize_click_position(x, y, width, height, shape='rectangle', roi_diminis
 
     return int(click_x), int(click_y)
 
-def interruptible_sleep(duration, check_interval=0.1):
-    """ Sleeps for a given duration, but checks script_running and script_paused periodically.
-        Returns False if interrupted by script_running becoming False, True otherwise.
+def interruptible_sleep(duration):
+    """ Sleeps for a given duration; a stop wakes it immediately and a pause holds it until resumed.
+        Returns False if interrupted by the script stopping, True otherwise.
     """
-    global script_running, script_paused
-    end_time = time.time() + duration
-    while time.time() < end_time:
-        if not script_running:
-            # print("Sleep interrupted by script stop.") # Optional: less verbose
-            return False # Indicate stop
-
-        # Handle pausing
-        paused_while_sleeping = False
-        while script_paused:
-            paused_while_sleeping = True
-            if not script_running:
-                 # print("Sleep interrupted by script stop during pause.") # Optional: less verbose
-                 return False # Indicate stop
-            time.sleep(check_interval) # Wait while paused
-
-        # Optional: Print resume message only if it was actually paused during this sleep call
-        # if paused_while_sleeping:
-        #    print("Resuming sleep...")
-
-        # Calculate remaining time to sleep for this interval, capped by end_time
-        current_time = time.time()
-        sleep_this_interval = min(check_interval, end_time - current_time)
-
-        if sleep_this_interval > 0:
-            time.sleep(sleep_this_interval)
-        elif end_time <= current_time: # Ensure loop terminates if precision issues occur
-             break
-
-    return True # Indicate sleep completed normally or was paused/resumed
+    return run_state.sleep(duration)
 
 
 # Modify smith to accept interactor
@@ -562,8 +524,7 @@ def smith(item, tier, interactor_instance):
     """ Performs the smithing actions for a given item and tier.
         Returns True if the entire process completes, False if interrupted by stop signal.
     """
-    global script_running, script_paused, in_smithing_loop # Ensure globals are accessible
-
+    phase_bus.publish(FORGE)
     # Activate window just in case
     interactor_instance.activate() # Use passed interactor
 
@@ -592,32 +553,33 @@ def smith(item, tier, interactor_instance):
         interactor_instance.click(click_x, click_y) # Use passed interactor
         if not interruptible_sleep(random.uniform(1.2, 1.4)): return False
 
-    # Start Smithing Keys (quick actions, minimal sleep ok)
-    interactor_instance.send_key(start_smithing)
-    if not interruptible_sleep(random.uniform(0.1, 0.15)): return False # Very short delay is fine
-    interactor_instance.send_key(start_smithing)
-    if not interruptible_sleep(random.uniform(0.1, 0.15)): return False
-    interactor_instance.send_key(start_smithing)
+    # Start Smithing Keys (quick actions, minimal sleep ok); no buff keys in between
+    with interactor_instance.exclusive():
+        interactor_instance.send_key(start_smithing)
+        if not interruptible_sleep(random.uniform(0.1, 0.15)): return False # Very short delay is fine
+        interactor_instance.send_key(start_smithing)
+        if not interruptible_sleep(random.uniform(0.1, 0.15)): return False
+        interactor_instance.send_key(start_smithing)
     # Wait for initial smithing action on forge
+    phase_bus.publish(FORGE, waiting=True)
     if not interruptible_sleep(random.uniform(6, 6.6)): return False
 
     # Select Anvil
+    phase_bus.publish(ANVIL)
     x, y, w, h = rois["anvil"]
     click_x, click_y = randomize_click_position(x, y, w, h, shape='rectangle', roi_diminish=2)
     interactor_instance.click(click_x, click_y) # Use passed interactor
+    phase_bus.publish(ANVIL, waiting=True)
     if not interruptible_sleep(16.2): return False  # Wait for smithing on anvil
 
     # --- Heating Loop (Superheat Spell or Forge) ---
-    in_smithing_loop = True  # Set flag to indicate we're in the smithing loop
     global heating_method, forge_heating_duration
     
-    while script_running: # Check stop flag at the start of each loop iteration
+    while run_state.running: # Check stop flag at the start of each loop iteration
         # Handle pause state before doing anything in the loop
-        while script_paused:
-            if not script_running:
-                in_smithing_loop = False  # Reset flag when stopping
-                return False # Allow stop during pause
-            time.sleep(0.1) # Short sleep while paused
+        if not run_state.wait_while_paused():
+            return False # Allow stop during pause
+        phase_bus.publish(HEATING)
 
         # Find Bar in bag
         bag_img = interactor_instance.capture(rois["bagpack"]) # Use passed interactor
@@ -626,29 +588,27 @@ def smith(item, tier, interactor_instance):
             if not interruptible_sleep(1): return False # Make error wait interruptible
             continue # Try capturing again
 
-        bar_data = find_image(bar_img, bag_img)  # Use the global bar_img template path
+        # Template match of the global bar_img on the slot the grid points at; the whole bagpack only when it can't
+        bbox = bagpack_inventory.locate('bar', bag_img, lambda img: find_image(bar_img, img)[1])
 
         # Check if the bar is detected
-        if bar_data and bar_data[-1] == 'Detected':
-            _, bbox, _, _, _ = bar_data
-            if bbox is None:
-                print("Bar detected but bbox is None. Skipping heating.")
-                break # Exit heating loop
-
+        if bbox is not None:
             if heating_method == "superheat_spell":
                 # Original superheat spell method
-                interactor_instance.send_key(superheat_spell) # Use passed interactor
-                if not interruptible_sleep(random.uniform(0.6, 0.65)): return False
-
-                # Click on the bar
-                bar_x_rel, bar_y_rel, bar_w, bar_h = bbox
-                bag_x, bag_y, _, _ = rois["bagpack"]
-                bar_x_abs = bag_x + bar_x_rel
-                bar_y_abs = bag_y + bar_y_rel
-
-                click_x, click_y = randomize_click_position(bar_x_abs, bar_y_abs, bar_w, bar_h, shape='rectangle', roi_diminish=2)
-                interactor_instance.click(click_x, click_y) # Use passed interactor
-                print(f"Superheating bar at ({click_x}, {click_y})")
+                with interactor_instance.exclusive():  # Spell key and bar click belong together
+                    interactor_instance.send_key(superheat_spell) # Use passed interactor
+                    if not interruptible_sleep(random.uniform(0.6, 0.65)): return False
+
+                    # Click on the bar
+                    bar_x_rel, bar_y_rel, bar_w, bar_h = bbox
+                    bag_x, bag_y, _, _ = rois["bagpack"]
+                    bar_x_abs = bag_x + bar_x_rel
+                    bar_y_abs = bag_y + bar_y_rel
+
+                    click_x, click_y = randomize_click_position(bar_x_abs, bar_y_abs, bar_w, bar_h, shape='rectangle', roi_diminish=2)
+                    interactor_instance.click(click_x, click_y) # Use passed interactor
+                    print(f"Superheating bar at ({click_x}, {click_y})")
+                phase_bus.publish(HEATING, waiting=True)
                 if not interruptible_sleep(random.uniform(16.2, 16.8)): return False  # Wait for superheat cooldown/action
                 
             elif heating_method == "forge":
@@ -671,19 +631,19 @@ def smith(item, tier, interactor_instance):
                 print(f"Clicking anvil for smithing at ({click_x}, {click_y})")
                 
                 # Continue with anvil work (similar timing to superheat method)
+                phase_bus.publish(HEATING, waiting=True)
                 if not interruptible_sleep(random.uniform(16.2, 16.8)): return False
                 
         else:
             print("No more bars found in bagpack or bar not detected. Ending heating loop.")
             break  # Exit heating loop if no bars found
 
-    # Reset the smithing loop flag when exiting the loop
-    in_smithing_loop = False
+    phase_bus.publish(IDLE)
     # --- End Heating Loop ---
 
     # If we reached here, the smith function completed its course without being stopped.
     # Return True only if the script is still marked as running.
-    return script_running
+    return run_state.running
 
 # --- New Input and Queue Logic ---
 def get_crafting_requests():
@@ -1314,6 +1274,7 @@ def configure_script_settings():
     config_data['buffs']['enable_attraction_potion'] = enable_attraction_potion
     config_data['buffs']['enable_powerburst'] = enable_powerburst
     config_data['buffs']['enable_superheat_form'] = enable_superheat_form
+    config_data['buffs']['idle_slack'] = buff_slack
     
     # Update initial durations with current session values
     if 'initial_durations' not in config_data['buffs']:
@@ -1339,331 +1300,28 @@ def configure_script_settings():
 
 
 # --- Background Task Functions ---
-def torstol_task(target_window_id):
-    global script_running, script_paused, enable_torstol_sticks, initial_torstol_wait, last_torstol_activation_time
-    if not enable_torstol_sticks:
-        print("Torstol task skipped (disabled in configuration).")
-        return
-
-    interactor_instance = X11WindowInteractor(window_id=target_window_id)
-    print(f"Torstol stick thread started (Interactor for window: {target_window_id}).")
-
-    target_expiry_time = 0
-    next_interval = random.uniform(585, 595) # Default interval
-
-    # Calculate initial target expiry time
-    if initial_torstol_wait > 0:
-        target_expiry_time = time.time() + initial_torstol_wait
-        print(f"Torstol: Initial wait set. Next check/activation around {time.strftime('%H:%M:%S', time.localtime(target_expiry_time))}")
-    else:
-        # Activate immediately if script is running and not paused
-        if script_running and not script_paused:
-            print("Activating Initial Torstol Sticks...")
-            interactor_instance.send_key(torstol_sticks)
-            last_torstol_activation_time = time.time()
-            # Use interruptible_sleep after activation
-            if not interruptible_sleep(random.uniform(0.6, 0.8)): return
-            target_expiry_time = last_torstol_activation_time + next_interval
-            print(f"Torstol: Initial activation done. Next activation around {time.strftime('%H:%M:%S', time.localtime(target_expiry_time))}")
-        elif script_running: # Started paused
-             last_torstol_activation_time = time.time() # Pretend it just activated
-             target_expiry_time = last_torstol_activation_time + next_interval
-             print(f"Torstol: Script started paused. Scheduling first activation around {time.strftime('%H:%M:%S', time.localtime(target_expiry_time))}")
-        else:
-             return # Script stopped before initial activation
-
-    while script_running:
-        try:
-            # --- Main Sleep Loop using interruptible_sleep ---
-            now = time.time()
-            while now < target_expiry_time:
-                if not script_running:
-                    print("Torstol stick thread stopping during wait.")
-                    return
-
-                # Calculate remaining time until expiry
-                remaining = target_expiry_time - now
-                # Sleep for a short interval or until expiry, whichever is less
-                sleep_duration = min(0.2, remaining)
-
-                # Use interruptible_sleep for the main wait interval
-                if not interruptible_sleep(sleep_duration):
-                    # If sleep was interrupted by stop signal, exit
-                    return
-
-                # Update 'now' after sleeping
-                now = time.time()
-            # --- End Main Sleep Loop ---
-
-
-            # Time is up, activate if still running (pause is handled by interruptible_sleep)
-            if script_running:
-                print("Activating Torstol Sticks...")
-                interactor_instance.send_key(torstol_sticks)
-                last_torstol_activation_time = time.time()
-                # Use interruptible_sleep after activation
-                if not interruptible_sleep(random.uniform(0.6, 0.8)): return
-
-                # Calculate NEXT target expiry time
-                next_interval = random.uniform(585, 595)
-                target_expiry_time = last_torstol_activation_time + next_interval
-                print(f"Torstol: Next activation scheduled around {time.strftime('%H:%M:%S', time.localtime(target_expiry_time))}")
-            else:
-                 print("Torstol stick thread stopping before activation.")
-                 return # Script stopped
-
-        except Exception as e:
-            print(f"Error in torstol_task: {e}")
-            print("Waiting before retrying loop...")
-            # Use interruptible sleep for the error wait
-            if not interruptible_sleep(5): return
-
-    print("Torstol stick thread finished.")
-
-
-def attraction_task(target_window_id):
-    global script_running, script_paused, enable_attraction_potion, initial_attraction_wait, last_attraction_activation_time
-    if not enable_attraction_potion:
-        print("Attraction task skipped (disabled in configuration).")
-        return
-
-    interactor_instance = X11WindowInteractor(window_id=target_window_id)
-    print(f"Attraction potion thread started (Interactor for window: {target_window_id}).")
-
-    target_expiry_time = 0
-    next_interval = random.uniform(880, 895) # Default interval
-
-    # Calculate initial target expiry time
-    if initial_attraction_wait > 0:
-        target_expiry_time = time.time() + initial_attraction_wait
-        print(f"Attraction: Initial wait set. Next check/activation around {time.strftime('%H:%M:%S', time.localtime(target_expiry_time))}")
-    else:
-        # Activate immediately if script is running and not paused
-        if script_running and not script_paused:
-            print("Activating Initial Attraction Potion...")
-            interactor_instance.send_key(attraction_potion)
-            last_attraction_activation_time = time.time()
-            # Use interruptible_sleep after activation
-            if not interruptible_sleep(random.uniform(0.6, 0.8)): return
-            target_expiry_time = last_attraction_activation_time + next_interval
-            print(f"Attraction: Initial activation done. Next activation around {time.strftime('%H:%M:%S', time.localtime(target_expiry_time))}")
-        elif script_running: # Started paused
-             last_attraction_activation_time = time.time() # Pretend it just activated
-             target_expiry_time = last_attraction_activation_time + next_interval
-             print(f"Attraction: Script started paused. Scheduling first activation around {time.strftime('%H:%M:%S', time.localtime(target_expiry_time))}")
-        else:
-            return # Script stopped before initial activation
-
-
-    while script_running:
-        try:
-             # --- Main Sleep Loop using interruptible_sleep ---
-            now = time.time()
-            while now < target_expiry_time:
-                if not script_running:
-                    print("Attraction potion thread stopping during wait.")
-                    return
-
-                # Calculate remaining time until expiry
-                remaining = target_expiry_time - now
-                # Sleep for a short interval or until expiry, whichever is less
-                sleep_duration = min(0.2, remaining)
-
-                # Use interruptible_sleep for the main wait interval
-                if not interruptible_sleep(sleep_duration):
-                     # If sleep was interrupted by stop signal, exit
-                    return
-
-                # Update 'now' after sleeping
-                now = time.time()
-            # --- End Main Sleep Loop ---
-
-
-            # Time is up, activate if still running
-            if script_running:
-                print("Activating Attraction Potion...")
-                interactor_instance.send_key(attraction_potion)
-                last_attraction_activation_time = time.time()
-                # Use interruptible_sleep after activation
-                if not interruptible_sleep(random.uniform(0.6, 0.8)): return
-
-                # Calculate NEXT target expiry time
-                next_interval = random.uniform(880, 895)
-                target_expiry_time = last_attraction_activation_time + next_interval
-                print(f"Attraction: Next activation scheduled around {time.strftime('%H:%M:%S', time.localtime(target_expiry_time))}")
-            else:
-                 print("Attraction potion thread stopping before activation.")
-                 return # Script stopped
-
-        except Exception as e:
-            print(f"Error in attraction_task: {e}")
-            print("Waiting before retrying loop...")
-            if not interruptible_sleep(5): return # Use interruptible sleep in except block
-
-    print("Attraction potion thread finished.")
-
-
-def powerburst_task(target_window_id):
-    global script_running, script_paused, enable_powerburst, initial_powerburst_wait, last_powerburst_activation_time, in_smithing_loop
-    if not enable_powerburst:
-        print("Powerburst task skipped (disabled in configuration).")
-        return
-
-    interactor_instance = X11WindowInteractor(window_id=target_window_id)
-    print(f"Powerburst thread started (Interactor for window: {target_window_id}).")
-
-    target_expiry_time = 0
-    next_interval = random.uniform(118, 122)  # ~2 minutes (120 seconds)
-
-    # Calculate initial target expiry time
-    if initial_powerburst_wait > 0:
-        target_expiry_time = time.time() + initial_powerburst_wait
-        print(f"Powerburst: Initial wait set. Next check/activation around {time.strftime('%H:%M:%S', time.localtime(target_expiry_time))}")
-    else:
-        # Don't activate immediately - wait until we're in the smithing loop
-        last_powerburst_activation_time = time.time()  # Pretend it just activated
-        target_expiry_time = last_powerburst_activation_time + next_interval
-        print(f"Powerburst: Scheduling first activation around {time.strftime('%H:%M:%S', time.localtime(target_expiry_time))}")
-
-    while script_running:
-        try:
-            # --- Main Sleep Loop using interruptible_sleep ---
-            now = time.time()
-            while now < target_expiry_time:
-                if not script_running:
-                    print("Powerburst thread stopping during wait.")
-                    return
-
-                # Calculate remaining time until expiry
-                remaining = target_expiry_time - now
-                # Sleep for a short interval or until expiry, whichever is less
-                sleep_duration = min(0.2, remaining)
-
-                # Use interruptible_sleep for the main wait interval
-                if not interruptible_sleep(sleep_duration):
-                    # If sleep was interrupted by stop signal, exit
-                    return
-
-                # Update 'now' after sleeping
-                now = time.time()
-            # --- End Main Sleep Loop ---
-
-            # Time is up, activate if still running AND we're in the smithing loop
-            if script_running and in_smithing_loop:
-                print("Activating Powerburst...")
-                interactor_instance.send_key(powerburst)
-                interactor_instance.send_key(powerburst)
-                interactor_instance.send_key(powerburst)
-                last_powerburst_activation_time = time.time()
-                # Use interruptible_sleep after activation
-                if not interruptible_sleep(random.uniform(0.6, 0.8)): return
-
-                # Calculate NEXT target expiry time
-                next_interval = random.uniform(118, 122)  # ~2 minutes
-                target_expiry_time = last_powerburst_activation_time + next_interval
-                print(f"Powerburst: Next activation scheduled around {time.strftime('%H:%M:%S', time.localtime(target_expiry_time))}")
-            elif script_running:
-                # We're not in the smithing loop, so check again soon
-                print("Powerburst: Not in smithing loop, checking again in 5 seconds...")
-                target_expiry_time = time.time() + 5  # Check again in 5 seconds
-            else:
-                print("Powerburst thread stopping before activation.")
-                return  # Script stopped
-
-        except Exception as e:
-            print(f"Error in powerburst_task: {e}")
-            print("Waiting before retrying loop...")
-            if not interruptible_sleep(5): return  # Use interruptible sleep in except block
-
-    print("Powerburst thread finished.")
-
-
-def superheat_form_task(target_window_id):
-    """Background task to maintain Superheat Form prayer if enabled."""
-    global script_running, script_paused, enable_superheat_form, initial_superheat_form_wait, last_superheat_form_activation_time
-    if not enable_superheat_form:
-        print("Superheat Form task skipped (disabled in configuration).")
-        return
-
-    interactor_instance = X11WindowInteractor(window_id=target_window_id)
-    print(f"Superheat Form thread started (Interactor for window: {target_window_id}).")
-
-    target_expiry_time = 0
-    next_interval = random.uniform(295, 305)  # ~5 minutes (300 seconds)
-
-    # Calculate initial target expiry time
-    if initial_superheat_form_wait > 0:
-        target_expiry_time = time.time() + initial_superheat_form_wait
-        print(f"Superheat Form: Initial wait set. Next check/activation around {time.strftime('%H:%M:%S', time.localtime(target_expiry_time))}")
-    else:
-        # Activate immediately if script is running and not paused
-        if script_running and not script_paused:
-            print("Activating Initial Superheat Form...")
-            interactor_instance.send_key(superheat_form)
-            last_superheat_form_activation_time = time.time()
-            # Use interruptible_sleep after activation
-            if not interruptible_sleep(random.uniform(0.6, 0.8)): return
-            target_expiry_time = last_superheat_form_activation_time + next_interval
-            print(f"Superheat Form: Initial activation done. Next activation around {time.strftime('%H:%M:%S', time.localtime(target_expiry_time))}")
-        elif script_running: # Started paused
-             last_superheat_form_activation_time = time.time() # Pretend it just activated
-             target_expiry_time = last_superheat_form_activation_time + next_interval
-             print(f"Superheat Form: Script started paused. Scheduling first activation around {time.strftime('%H:%M:%S', time.localtime(target_expiry_time))}")
-        else:
-             return # Script stopped before initial activation
-
-    while script_running:
-        try:
-            # --- Main Sleep Loop using interruptible_sleep ---
-            now = time.time()
-            while now < target_expiry_time:
-                if not script_running:
-                    print("Superheat Form thread stopping during wait.")
-                    return
-
-                # Calculate remaining time until expiry
-                remaining = target_expiry_time - now
-                # Sleep for a short interval or until expiry, whichever is less
-                sleep_duration = min(0.2, remaining)
-
-                # Use interruptible_sleep for the main wait interval
-                if not interruptible_sleep(sleep_duration):
-                    # If sleep was interrupted by stop signal, exit
-                    return
-
-                # Update 'now' after sleeping
-                now = time.time()
-            # --- End Main Sleep Loop ---
-
-            # Time is up, activate if still running (pause is handled by interruptible_sleep)
-            if script_running:
-                print("Activating Superheat Form...")
-                interactor_instance.send_key(superheat_form)
-                last_superheat_form_activation_time = time.time()
-                # Use interruptible_sleep after activation
-                if not interruptible_sleep(random.uniform(0.6, 0.8)): return
-
-                # Calculate NEXT target expiry time
-                next_interval = random.uniform(295, 305)  # ~5 minutes
-                target_expiry_time = last_superheat_form_activation_time + next_interval
-                print(f"Superheat Form: Next activation scheduled around {time.strftime('%H:%M:%S', time.localtime(target_expiry_time))}")
-            else:
-                 print("Superheat Form thread stopping before activation.")
-                 return # Script stopped
-
-        except Exception as e:
-            print(f"Error in superheat_form_task: {e}")
-            print("Waiting before retrying loop...")
-            # Use interruptible sleep for the error wait
-            if not interruptible_sleep(5): return
-
-    print("Superheat Form thread finished.")
+def start_buff_scheduler(target_window_id):
+    """Schedule every enabled buff on a single timer thread."""
+    global buff_scheduler
+    buff_scheduler = BuffScheduler(dispatched_interactor(target_window_id, BUFF), run_state, phase_bus, slack=buff_slack)
+    if enable_torstol_sticks:
+        buff_scheduler.add(BuffJob("Torstol Sticks", torstol_sticks, (585, 595), initial_wait=initial_torstol_wait))
+    if enable_attraction_potion:
+        buff_scheduler.add(BuffJob("Attraction Potion", attraction_potion, (880, 895), initial_wait=initial_attraction_wait))
+    if enable_powerburst:
+        # Only drink while smithing; don't activate immediately - wait until we're in the smithing loop
+        buff_scheduler.add(BuffJob("Powerburst", powerburst, (118, 122), initial_wait=initial_powerburst_wait,
+                                   activate_now=False, presses=3, phases={HEATING}))
+    if enable_superheat_form:
+        buff_scheduler.add(BuffJob("Superheat Form", superheat_form, (295, 305), initial_wait=initial_superheat_form_wait))
+    buff_scheduler.start()
 # --- End Background Task Functions ---
 
 
 def main_script(target_window_id):
-    global script_running, script_paused, crafting_queue, enable_superheat_form
-    interactor_instance = X11WindowInteractor(window_id=target_window_id)
+    global crafting_queue, enable_superheat_form
+    # Input goes through the window's dispatcher, so buff keys can't cut into a click sequence
+    interactor_instance = dispatched_interactor(target_window_id, CRAFTING)
     print(f"Main script thread started (Interactor for window: {target_window_id}).")
 
     print("Activating window...")
@@ -1676,7 +1334,7 @@ def main_script(target_window_id):
         max_retries = 3
         superheat_active = False
         for attempt in range(max_retries):
-            if not script_running: return # Stop if script was stopped externally
+            if not run_state.running: return # Stop if script was stopped externally
             print(f"Superheat Form check (Attempt {attempt + 1}/{max_retries})...")
             try:
                 buff_img = interactor_instance.capture(rois["buff"])
@@ -1685,7 +1343,7 @@ def main_script(target_window_id):
                     if not interruptible_sleep(1.5): return # Use interruptible sleep
                     continue
 
-                _, _, _, _, status = find_image(superheat_form_img, buff_img, lineant_matcher)
+                _, _, _, _, status = find_image(superheat_form_img, buff_img, get_matcher('lenient'), first_hit=True)
 
                 if status == 'Detected':
                     print("Superheat Form detected.")
@@ -1703,7 +1361,7 @@ def main_script(target_window_id):
                          if not interruptible_sleep(1.5): return # Use interruptible sleep
                          continue
 
-                    _, _, _, _, status_after = find_image(superheat_form_img, buff_img_after, lineant_matcher)
+                    _, _, _, _, status_after = find_image(superheat_form_img, buff_img_after, get_matcher('lenient'), first_hit=True)
                     if status_after == 'Detected':
                          print("Superheat Form activated successfully.")
                          superheat_active = True
@@ -1722,7 +1380,7 @@ def main_script(target_window_id):
 
         if not superheat_active:
             print("Failed to activate or verify Superheat Form after multiple attempts. Stopping script.")
-            script_running = False # Ensure other loops stop
+            run_state.stop() # Ensure other loops stop
             return # Stop main_script execution
     else:
         print("Superheat Form is disabled. Skipping superheat form check.")
@@ -1730,12 +1388,9 @@ def main_script(target_window_id):
 
 
     print("Processing queue...")
-    while script_running:
+    while run_state.running:
         # Handle pause state at the beginning of the loop
-        while script_paused:
-            if not script_running: break # Allow stop during pause
-            time.sleep(0.1) # Short sleep while paused
-        if not script_running: break # Exit loop if stopped
+        if not run_state.wait_while_paused(): break # Exit loop if stopped
 
         if crafting_queue:
             # Peek at the next task without removing it yet
@@ -1744,10 +1399,13 @@ def main_script(target_window_id):
             print(f"Tasks remaining: {len(crafting_queue)}")
             try:
                 # Execute the smithing task
-                task_completed_successfully = smith(item, tier, interactor_instance)
+                try:
+                    task_completed_successfully = smith(item, tier, interactor_instance)
+                finally:
+                    phase_bus.publish(IDLE)  # smith() returns from any phase when stopped
 
                 # Check script status *after* smith returns
-                if not script_running:
+                if not run_state.running:
                     print("Script stopped during or immediately after smithing task.")
                     break # Exit main loop
 
@@ -1759,10 +1417,10 @@ def main_script(target_window_id):
                     if not interruptible_sleep(random.uniform(1.5, 2.5)):
                         break # Stop if sleep interrupted
                 else:
-                     # This case should ideally not be reached if script_running is checked correctly
+                     # This case should ideally not be reached if the run state is checked correctly
                      # after the smith call, but it's a safeguard.
                      print(f"Smithing task ({item}, {tier}) reported incomplete, but script still running. Stopping.")
-                     script_running = False
+                     run_state.stop()
                      break
 
             except Exception as e:
@@ -1772,23 +1430,131 @@ def main_script(target_window_id):
                      print("Detected potential threading issue with display interaction. Stopping script.")
                 else:
                      print("Stopping script due to unexpected error in main loop.")
-                script_running = False
+                run_state.stop()
                 break # Exit main loop on error
         else:
             print("Crafting queue is empty. Stopping script.")
-            script_running = False # Set flag to false
+            run_state.stop()
             break # Exit main loop
 
     print("Main script loop finished.")
 
 
+def start_script(target_window_id):
+    """Start the crafting thread and the buff scheduler for the configured queue."""
+    run_state.start()
+    print("Script starting...")
+    # Start main crafting thread
+    threading.Thread(target=main_script, args=(target_window_id,), daemon=True).start()
+
+    # One scheduler thread for all enabled buffs
+    start_buff_scheduler(target_window_id)
+    
+    # Show which buffs are enabled
+    enabled_buffs = []
+    if enable_torstol_sticks: enabled_buffs.append("Torstol Sticks")
+    if enable_attraction_potion: enabled_buffs.append("Attraction Potion")
+    if enable_powerburst: enabled_buffs.append("Powerburst")
+    if enable_superheat_form: enabled_buffs.append("Superheat Form")
+    
+    if enabled_buffs:
+        print(f"Scheduled buffs: {', '.join(enabled_buffs)}")
+    else:
+        print("No buffs scheduled (all buffs disabled).")
+
+
+# --- Headless Start (--profile/--queue/--start) ---
+def plan_tasks(plan, problems):
+    """Crafting tasks for a queue plan: a list of {"item", "tier", "quantity" (1), "have" (none)}.
+
+    Same expansion as the prompts: every tier after the one you have, up to
+    the target, ``quantity`` times.  Problems are appended to ``problems``.
+    """
+    tasks = []
+    if not isinstance(plan, list):
+        problems.append("the queue plan must be a list of requests")
+        return tasks
+    all_items = get_all_available_items()
+    first_tier_index = 1 if len(ordered_tiers) > 1 and ordered_tiers[0] == "tierless" else 0
+    for n, request in enumerate(plan, 1):
+        if not isinstance(request, dict):
+            problems.append(f"request {n}: expected an object with item/tier/quantity/have")
+            continue
+        item, target_tier = request.get('item'), request.get('tier')
+        have_tier, quantity = request.get('have'), request.get('quantity', 1)
+        if item not in all_items:
+            problems.append(f"request {n}: unknown item {item!r} (available: {', '.join(all_items)})")
+            continue
+        if target_tier not in ordered_tiers:
+            problems.append(f"request {n}: tier {target_tier!r} is not one of {', '.join(ordered_tiers)}")
+            continue
+        if not isinstance(quantity, int) or quantity <= 0:
+            problems.append(f"request {n}: quantity must be a positive whole number")
+            continue
+
+        if target_tier == "tierless":
+            steps = [target_tier]
+        else:
+            target_tier_index = ordered_tiers.index(target_tier)
+            if have_tier is None:
+                start_crafting_index = first_tier_index
+            elif have_tier in ordered_tiers and ordered_tiers.index(have_tier) < target_tier_index:
+                start_crafting_index = ordered_tiers.index(have_tier) + 1
+            else:
+                problems.append(f"request {n}: have tier {have_tier!r} must be a tier before {target_tier}")
+                continue
+            steps = ordered_tiers[start_crafting_index:target_tier_index + 1]
+        tasks.extend([(item, tier) for tier in steps] * quantity)
+    if not tasks and not problems:
+        problems.append("the queue plan is empty")
+    return tasks
+
+
+def profile_problems(tasks):
+    """What's missing from the loaded profile to run ``tasks``."""
+    required = ["forge", "anvil", "metal_bar", "bagpack"]
+    required += sorted({item for item, _ in tasks} | {tier for _, tier in tasks if tier != "tierless"})
+    if enable_superheat_form:
+        required.append("buff")
+    problems = missing_rois(rois, required)
+    if heating_method not in ("superheat_spell", "forge"):
+        problems.append(f"unknown heating method {heating_method!r}")
+    if not os.path.exists(bar_img):
+        problems.append(f"bar template {bar_img} is missing")
+    return problems
+
+
+def start_from_profile(queue_path):
+    """Start from the loaded profile and the queue plan at ``queue_path``, without prompts. False if unusable."""
+    if not queue_path:
+        print("Error: --start needs a queue plan (--queue).")
+        return False
+    plan = load_json(queue_path, "Queue plan")
+    if plan is None:
+        return False
+    problems = []
+    tasks = plan_tasks(plan, problems)
+    if not check_problems(problems + profile_problems(tasks), f"{os.path.abspath(config_file)} and {queue_path}"):
+        return False
+
+    crafting_queue.clear()
+    crafting_queue.extend(tasks)
+    print(f"Queued {len(tasks)} tasks from {queue_path}.")
+    target_window_id = default_interactor().window_id
+    if target_window_id is None:
+        print("Error: Could not determine target window ID from the default interactor.")
+        return False
+    print(f"Using Window ID: {target_window_id} for threads.")
+    start_script(target_window_id)
+    return True
+# --- End Headless Start ---
+
+
 def on_press(key):
-    global script_running, script_paused, interactor
-    global enable_torstol_sticks, enable_attraction_potion, enable_powerburst, enable_superheat_form
     try:
         # Check for F11, F12, and F10 keys
         if key == pkeyboard.Key.f11:  # F11 key to start/pause
-            if not script_running:
+            if not run_state.running:
                 # --- Configuration Step ---
                 if not configure_script_settings():
                     print("Configuration aborted. Script not started.")
@@ -1802,63 +1568,37 @@ def on_press(key):
                 # --- Start Script ---
                 target_window_id = None
                 try:
-                    target_window_id = interactor.window_id
+                    target_window_id = default_interactor().window_id
                     if target_window_id is None:
-                         print("Error: Could not determine target window ID from global interactor.")
+                         print("Error: Could not determine target window ID from the default interactor.")
                          print("Please ensure the target window is active or run with RECALIBRATE=True once.")
                          return
 
                     print(f"Using Window ID: {target_window_id} for threads.")
 
                 except Exception as e:
-                    print(f"Error getting window ID from global interactor: {e}")
+                    print(f"Error getting window ID from the default interactor: {e}")
                     return
 
-                script_running = True
-                script_paused = False
-                print("Script starting...")
-                # Start main crafting thread
-                threading.Thread(target=main_script, args=(target_window_id,), daemon=True).start()
-
-                # Start individual buff threads based on enable flags
-                if enable_torstol_sticks:
-                    threading.Thread(target=torstol_task, args=(target_window_id,), daemon=True).start()
-                if enable_attraction_potion:
-                    threading.Thread(target=attraction_task, args=(target_window_id,), daemon=True).start()
-                if enable_powerburst:
-                    threading.Thread(target=powerburst_task, args=(target_window_id,), daemon=True).start()
-                if enable_superheat_form:
-                    threading.Thread(target=superheat_form_task, args=(target_window_id,), daemon=True).start()
-                
-                # Show which buffs are enabled
-                enabled_buffs = []
-                if enable_torstol_sticks: enabled_buffs.append("Torstol Sticks")
-                if enable_attraction_potion: enabled_buffs.append("Attraction Potion")
-                if enable_powerburst: enabled_buffs.append("Powerburst")
-                if enable_superheat_form: enabled_buffs.append("Superheat Form")
-                
-                if enabled_buffs:
-                    print(f"Started buff threads for: {', '.join(enabled_buffs)}")
-                else:
-                    print("No buff threads started (all buffs disabled).")
+                start_script(target_window_id)
 
             else:
                 # --- Pause/Resume Logic ---
-                script_paused = not script_paused
-                if script_paused:
+                run_state.toggle_pause()
+                if run_state.paused:
                     print("--- Script Paused ---")
                     # Optionally clear output or show paused state
                 else:
                     print("--- Script Resumed ---")
-                    # Background threads will handle resuming timers automatically
+                    # Threads blocked on the pause continue from here
 
         elif key == pkeyboard.Key.f10:  # F10 key to recalibrate
-            if not script_running:
+            if not run_state.running:
                 print("--- Starting Recalibration (F10 pressed) ---")
                 # Get the window ID
-                target_window_id = interactor.window_id
+                target_window_id = default_interactor().window_id
                 if target_window_id is None:
-                    print("Error: Could not determine target window ID from global interactor.")
+                    print("Error: Could not determine target window ID from the default interactor.")
                     print("Please ensure the target window is active.")
                     return
 
@@ -1882,12 +1622,11 @@ def on_press(key):
                 print("Cannot recalibrate while script is running. Stop the script first (F12).")
 
         elif key == pkeyboard.Key.f12:  # F12 key to stop
-            if script_running:
+            if run_state.running:
                 print("--- Stopping script immediately (F12 pressed) ---")
-                script_running = False
-                script_paused = False
-                # Threads are daemons, they will exit when the main script finishes
-                # or check the script_running flag internally.
+                run_state.stop()
+                print_cascade_stats()
+                # Sleeping threads are woken by the stop and exit on their own
     except AttributeError:
         # Usually happens with special keys that don't have a 'char' attribute, safe to ignore here.
         pass
@@ -1902,4 +1641,6 @@ def start_listener():
 
 
 if __name__ == "__main__":
+    if args.start and not start_from_profile(args.queue):
+        sys.exit(1)
     start_listener()
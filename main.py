@@ -1,6 +1,7 @@
-def main():
-    print("Hello from rs3-helpers!")
+import sys
+
+from rs3_helpers.supervisor import main
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,5 @@
+"""Shared building blocks for the rs3 helper scripts.
+
+The helpers live in their own directories and are run as plain scripts, so each
+one puts the repository root on ``sys.path`` before importing from here.
+"""
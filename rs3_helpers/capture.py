@@ -0,0 +1,61 @@
+"""Capture sharing between helpers running in one process.
+
+When several helpers run under the supervisor they often grab the same region
+of the same window at nearly the same moment (two buff checks on the buff bar,
+a progress read and a buff check).  ``CaptureService`` hands out one capture
+per window region for ``FRAME_MAX_AGE`` seconds: concurrent requests wait for
+the capture already in flight instead of starting their own.
+"""
+
+import threading
+import time
+
+# Frames younger than this are served to other callers instead of capturing again
+FRAME_MAX_AGE = 0.05
+
+
+class CaptureService:
+    """Window-region captures shared between callers for ``max_age`` seconds."""
+
+    def __init__(self, max_age=FRAME_MAX_AGE):
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._frames = {}    # (window id, roi) -> (capture time, frame)
+        self._inflight = {}  # (window id, roi) -> Event set when that capture is done
+        self._lock = threading.Lock()
+
+    def capture(self, interactor, roi=None):
+        """Capture ``roi`` (or the whole window) through ``interactor``, or reuse a fresh enough frame.
+
+        Every caller gets its own copy, so frames can be modified freely.
+        """
+        key = (interactor.window_id, tuple(roi) if roi is not None else None)
+        while True:
+            with self._lock:
+                entry = self._frames.get(key)
+                if entry is not None and time.monotonic() - entry[0] <= self.max_age:
+                    self.hits += 1
+                    return entry[1].copy()
+                pending = self._inflight.get(key)
+                if pending is None:
+                    self._inflight[key] = threading.Event()
+                    self.misses += 1
+                    break
+            pending.wait()
+
+        frame = None
+        try:
+            frame = interactor.capture(roi) if roi is not None else interactor.capture()
+            return frame
+        finally:
+            with self._lock:
+                now = time.monotonic()
+                for stale in [k for k, (t, _) in self._frames.items() if now - t > self.max_age]:
+                    del self._frames[stale]
+                if frame is not None:
+                    self._frames[key] = (now, frame.copy())
+                self._inflight.pop(key).set()
+
+
+capture_service = CaptureService()
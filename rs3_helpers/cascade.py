@@ -0,0 +1,146 @@
+"""Cheap rejection stages in front of the full template matcher.
+
+Most lookups end in "not detected" (the last bar is gone, a buff expired), and
+the 150-scale ``ColorMatcher`` is the most expensive way to learn that.  Before
+it runs, ``prefilter`` tries two cheaper stages:
+
+1. colour presence - the template's dominant colours must occur in the
+   screenshot often enough to fit the template at the smallest scale;
+2. grayscale check - with a known scale, one ``matchTemplate`` at that scale
+   must not score far below anything a real match produces.
+
+Both stages only reject, and only clear negatives: a missed bar or buff costs
+more than a matcher run, so anything doubtful is decided by the matcher.
+Stage 1 counts colours over the whole screenshot, so it costs about a
+millisecond on a full-window capture and far less on the small ROI captures
+the helpers mostly pass in.  ``cascade_stats`` counts rejections and time per
+stage.
+"""
+
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from rs3_helpers.scale_search import DEFAULT_MIN_SCALE, load_template, scaled_template
+
+# Colours quantised to 3 bits per channel
+COLOR_SHIFT = 5
+COLOR_BINS = 1 << (3 * (8 - COLOR_SHIFT))
+# Dominant colours: the largest bins covering this share of the template, at most MAX_DOMINANT_COLORS
+DOMINANT_COVERAGE = 0.6
+MAX_DOMINANT_COLORS = 4
+# Share of a dominant colour's (scaled) pixel count that must be present in the screenshot
+PRESENCE_FRACTION = 0.25
+# Grayscale scores below this reject. Its own bound rather than the matcher's threshold: that one
+# belongs to a colour metric and a multi-scale search, this is one grayscale score at a fixed scale
+GRAYSCALE_REJECT_BELOW = 0.2
+
+STAGES = ('color', 'grayscale', 'matcher')
+
+_signatures = {}  # template path -> [(bins, min counts)] for both channel orders
+_stats = {stage: {'runs': 0, 'rejected': 0, 'seconds': 0.0} for stage in STAGES}
+_lock = threading.Lock()
+
+
+def _color_keys(image):
+    q = (image[:, :, :3] >> COLOR_SHIFT).astype(np.int32)
+    bits = 8 - COLOR_SHIFT
+    return (q[:, :, 0] << (2 * bits)) | (q[:, :, 1] << bits) | q[:, :, 2]
+
+
+def _signature(template_path):
+    """Dominant colour bins of the template and their pixel counts, for BGR and RGB order."""
+    with _lock:
+        signature = _signatures.get(template_path)
+    if signature is None:
+        template = load_template(template_path)
+        if template is None:
+            return None
+        signature = []
+        # Templates on disk and captures don't always agree on channel order
+        for image in (template, template[:, :, ::-1]):
+            counts = np.bincount(_color_keys(image).ravel(), minlength=COLOR_BINS)
+            order = np.argsort(counts)[::-1]
+            covered = np.cumsum(counts[order]) / counts.sum()
+            n = min(MAX_DOMINANT_COLORS, int(np.searchsorted(covered, DOMINANT_COVERAGE)) + 1)
+            signature.append((order[:n], counts[order[:n]]))
+        with _lock:
+            _signatures[template_path] = signature
+    return signature
+
+
+def _record(stage, rejected, started):
+    with _lock:
+        stats = _stats[stage]
+        stats['runs'] += 1
+        stats['rejected'] += int(rejected)
+        stats['seconds'] += time.perf_counter() - started
+
+
+def color_present(template_path, screenshot, scale=None):
+    """Stage 1: do the template's dominant colours occur often enough in the screenshot?"""
+    signature = _signature(template_path)
+    if signature is None:
+        return True  # Let the matcher report the problem
+    area = (scale if scale else DEFAULT_MIN_SCALE) ** 2
+    counts = np.bincount(_color_keys(screenshot).ravel(), minlength=COLOR_BINS)
+    return any(np.all(counts[bins] >= template_counts * area * PRESENCE_FRACTION)
+               for bins, template_counts in signature)
+
+
+def _channel_mean(image):
+    image = np.ascontiguousarray(image[:, :, :3])
+    # Plain mean of the channels, so the score doesn't depend on channel order either
+    return cv2.transform(image, np.full((1, 3), 1.0 / 3.0, dtype=np.float32))
+
+
+def grayscale_score(template_path, screenshot, scale):
+    """Stage 2: best grayscale correlation of the template at a fixed scale (-1.0 if it doesn't fit)."""
+    scaled = scaled_template(template_path, scale, 'color')
+    if scaled is None or scaled.shape[0] > screenshot.shape[0] or scaled.shape[1] > screenshot.shape[1]:
+        return -1.0
+    result = cv2.matchTemplate(_channel_mean(screenshot), _channel_mean(scaled), cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, _ = cv2.minMaxLoc(result)
+    return float(max_val) if np.isfinite(max_val) else -1.0
+
+
+def prefilter(template_path, screenshot, scale=None):
+    """Run the cheap stages. Returns the name of the rejecting stage, or None to run the matcher."""
+    if screenshot is None or screenshot.ndim != 3:
+        return None
+
+    started = time.perf_counter()
+    rejected = not color_present(template_path, screenshot, scale)
+    _record('color', rejected, started)
+    if rejected:
+        return 'color'
+
+    if scale:
+        started = time.perf_counter()
+        rejected = grayscale_score(template_path, screenshot, scale) < GRAYSCALE_REJECT_BELOW
+        _record('grayscale', rejected, started)
+        if rejected:
+            return 'grayscale'
+    return None
+
+
+def record_matcher(detected, started):
+    """Account a full matcher run that started at ``started`` (perf_counter)."""
+    _record('matcher', not detected, started)
+
+
+def cascade_stats():
+    """Copy of the per-stage counters: runs, rejections and total seconds."""
+    with _lock:
+        return {stage: dict(stats) for stage, stats in _stats.items()}
+
+
+def print_cascade_stats():
+    """Print where lookups were rejected and what each stage cost."""
+    print("Detection cascade:")
+    for stage, stats in cascade_stats().items():
+        runs = stats['runs']
+        avg_ms = stats['seconds'] / runs * 1000 if runs else 0.0
+        print(f"  {stage:<10} runs {runs:>6}  rejected {stats['rejected']:>6}  avg {avg_ms:8.3f} ms")
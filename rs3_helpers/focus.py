@@ -0,0 +1,126 @@
+"""Which window has the input focus, kept current from X property events.
+
+Every ``activate()`` is an X round-trip and may make the window manager move
+the focus.  ``FocusTracker`` listens for changes of the root window's
+``_NET_ACTIVE_WINDOW`` property on its own X connection, so the input
+dispatcher can tell without asking the server whether the game window still
+has the focus, and only activate it when it doesn't.  The active window is
+only ever taken from the property, never assumed after an ``activate()``: a
+window manager that refuses the activation (focus-stealing prevention) sends
+no event, and the next ``activate()`` has to be sent again.
+
+Windows are compared by their top-level window (the child of the root they
+sit under): the interactor may hold a client or child window id, while the
+property names the client, and under a reparenting window manager both sit
+below the same frame.
+"""
+
+import threading
+
+try:
+    from Xlib import X, display as xdisplay
+except ImportError:
+    X = xdisplay = None
+
+
+def _window_int(window_id):
+    # Window ids may come as ints or as strings like '0x3a00007'
+    return int(window_id, 0) if isinstance(window_id, str) else int(window_id)
+
+
+def _toplevel(window):
+    """Id of the ancestor of ``window`` that is a direct child of the root (``window`` itself if it is one)."""
+    while True:
+        tree = window.query_tree()
+        parent = getattr(tree.parent, 'id', tree.parent)
+        if not parent or parent == tree.root.id:
+            return window.id
+        window = tree.parent
+
+
+class FocusTracker:
+    """Active window id, updated by a thread waiting on ``_NET_ACTIVE_WINDOW`` changes.
+
+    ``available`` is False until the thread has connected, and stays False if
+    the X server or window manager doesn't provide the property; callers then
+    can't rely on ``has_focus`` and fall back to their own deduplication.
+    """
+
+    def __init__(self):
+        self.active_window = None  # Top-level window of the active window
+        self.available = False
+        self._toplevels = {}  # window id -> its top-level window
+        self._toplevels_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def has_focus(self, window_id):
+        """True if ``window_id`` is known to be (inside) the active window."""
+        if not self.available or window_id is None:
+            return False
+        return self.active_window == self.toplevel(window_id)
+
+    def toplevel(self, window_id):
+        """Top-level window containing ``window_id``, looked up once per window on a short-lived connection."""
+        window_id = _window_int(window_id)
+        with self._toplevels_lock:
+            if window_id not in self._toplevels:
+                try:
+                    disp = xdisplay.Display()
+                    try:
+                        self._toplevels[window_id] = _toplevel(disp.create_resource_object('window', window_id))
+                    finally:
+                        disp.close()
+                except Exception as e:
+                    print(f"Could not resolve the top-level window of {window_id:#x} ({e}).")
+                    self._toplevels[window_id] = window_id
+            return self._toplevels[window_id]
+
+    def _read_active(self, disp, root, atom):
+        prop = root.get_full_property(atom, X.AnyPropertyType)
+        if prop is None or not len(prop.value) or not prop.value[0]:
+            return None
+        try:
+            return _toplevel(disp.create_resource_object('window', int(prop.value[0])))
+        except Exception:
+            return int(prop.value[0])  # Window already gone; it can't be ours anyway
+
+    def _run(self):
+        try:
+            if xdisplay is None:
+                raise RuntimeError("python-xlib is not installed")
+            # Own connection, only used from this thread
+            disp = xdisplay.Display()
+            root = disp.screen().root
+            atom = disp.intern_atom('_NET_ACTIVE_WINDOW')
+            root.change_attributes(event_mask=X.PropertyChangeMask)
+            if root.get_full_property(atom, X.AnyPropertyType) is None:
+                raise RuntimeError("the window manager doesn't set _NET_ACTIVE_WINDOW")
+            self.active_window = self._read_active(disp, root, atom)
+            self.available = True
+        except Exception as e:
+            print(f"Focus tracking unavailable ({e}). activate() calls are only deduplicated by time.")
+            return
+
+        while True:
+            try:
+                event = disp.next_event()
+                if event.type == X.PropertyNotify and event.atom == atom:
+                    self.active_window = self._read_active(disp, root, atom)
+            except Exception as e:
+                print(f"Focus tracking stopped ({e}). activate() calls are only deduplicated by time.")
+                self.available = False
+                return
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_focus_tracker():
+    """The process-wide focus tracker, started on first use."""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = FocusTracker()
+        return _tracker
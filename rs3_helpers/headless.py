@@ -0,0 +1,58 @@
+"""Command line for starting a helper without its configuration prompts.
+
+On F11 every helper walks through a chain of prompts before any work starts.
+With ``--start`` it instead takes everything from a saved profile (a config
+file as the prompts write it) and, for the crafting helpers, a queue plan,
+checks them once, starts right away and then only listens for F11
+(pause/resume) and F12 (stop), e.g. for automated restarts:
+
+    python auto-smithing/main.py --profile config.json --queue plan.json --start
+
+``--profile`` alone just swaps the config file the prompts read and save.
+"""
+
+import argparse
+import json
+import os
+
+
+def parse_args(description, queue=False, argv=None):
+    """``--profile``/``--start`` (and ``--queue`` for crafting helpers) from the command line."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--profile', help="Config file to use instead of the helper's config.json")
+    if queue:
+        parser.add_argument('--queue', help="JSON plan of the crafting queue (with --start)")
+    parser.add_argument('--start', action='store_true',
+                        help="Start straight away from the profile, without configuration prompts")
+    args = parser.parse_args(argv)
+    if args.profile and not os.path.isfile(args.profile):
+        parser.error(f"profile {args.profile} not found")
+    if queue and args.queue and not args.start:
+        parser.error("--queue is only used with --start")
+    return args
+
+
+def load_json(path, what):
+    """Contents of the JSON file at ``path``, or None after printing why it can't be read."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print(f"Error: {what} {path} not found.")
+    except json.JSONDecodeError as e:
+        print(f"Error: {what} {path} is not valid JSON: {e}")
+    return None
+
+
+def missing_rois(rois, keys):
+    """A problem for each of ``keys`` without a calibrated ROI."""
+    return [f"ROI '{key}' is not calibrated" for key in keys if not rois.get(key)]
+
+
+def check_problems(problems, what):
+    """Print ``problems`` found in ``what``. True if there are none."""
+    if problems:
+        print(f"Cannot start from {what}:")
+        for problem in problems:
+            print(f"  - {problem}")
+    return not problems
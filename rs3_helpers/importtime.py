@@ -0,0 +1,98 @@
+"""Startup report for the helper scripts, based on ``python -X importtime``.
+
+    python -m rs3_helpers.importtime [SCRIPT ...] [--top N]
+
+Each script is loaded as a module (its ``__main__`` block doesn't run) in a
+fresh interpreter under ``-X importtime``.  The report shows the time until
+the script is ready to show its banner, the slowest imports it pulls in, and
+which of the heavy libraries (torch, easyocr, IPython, cv2) got loaded on the
+way.  Default is every ``auto-*/main.py``.
+"""
+
+import argparse
+import glob
+import os
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that should only be imported on the code path that needs them
+HEAVY_MODULES = ('torch', 'easyocr', 'IPython', 'cv2')
+
+# Runs in the child: load the script without running its __main__ block
+_LOADER = (
+    "import importlib.util, sys, time\n"
+    "start = time.perf_counter()\n"
+    "spec = importlib.util.spec_from_file_location('rs3_importtime_target', sys.argv[1])\n"
+    "module = importlib.util.module_from_spec(spec)\n"
+    "spec.loader.exec_module(module)\n"
+    "print(f'script loaded in {time.perf_counter() - start:.6f}', file=sys.stderr)\n"
+)
+
+
+def parse_importtime(output):
+    """(module, self µs, cumulative µs, depth) for every import in ``-X importtime`` output."""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line.split(':', 1)[1].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # Header line
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(fields[0]), int(fields[1]), depth))
+    return imports
+
+
+def profile_script(script_path):
+    """Load ``script_path`` in a child interpreter. Returns (wall seconds, load seconds, imports, stderr)."""
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', _LOADER, script_path],
+                            cwd=REPO_ROOT, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    load = None
+    for line in result.stderr.splitlines():
+        if line.startswith('script loaded in '):
+            load = float(line.rsplit(' ', 1)[1])
+    return wall, load, parse_importtime(result.stderr), result.stderr
+
+
+def report(script_path, top):
+    print(f"\n=== {os.path.relpath(script_path, REPO_ROOT)} ===")
+    wall, load, imports, stderr = profile_script(script_path)
+    if load is None:
+        print("Failed to load the script:")
+        print("\n".join(line for line in stderr.splitlines() if not line.startswith('import time:'))[-2000:])
+        return False
+
+    print(f"Time to banner: {wall:.2f} s (interpreter start included), script load: {load:.2f} s")
+    loaded = {name.split('.')[0] for name, _, _, _ in imports}
+    heavy = [name for name in HEAVY_MODULES if name in loaded]
+    print(f"Heavy modules loaded: {', '.join(heavy) if heavy else 'none'}")
+
+    top_level = sorted((imp for imp in imports if imp[3] == 0), key=lambda imp: imp[2], reverse=True)
+    print("Slowest top-level imports (cumulative):")
+    for name, _, cumulative, _ in top_level[:top]:
+        print(f"  {cumulative / 1e6:7.3f} s  {name}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import time of the helper scripts.")
+    parser.add_argument('scripts', nargs='*', help="Script paths (default: every auto-*/main.py)")
+    parser.add_argument('--top', type=int, default=15, help="How many imports to list per script")
+    args = parser.parse_args()
+
+    scripts = [os.path.abspath(script) for script in args.scripts]
+    scripts = scripts or sorted(glob.glob(os.path.join(REPO_ROOT, 'auto-*', 'main.py')))
+    ok = True
+    for script in scripts:
+        ok = report(script, args.top) and ok
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""One input thread per game window, serving clicks and keys by priority.
+
+Buff timers, OCR monitors and the main crafting loop used to drive the window
+through their own ``X11WindowInteractor`` instances, so a buff keypress could
+land in the middle of a click sequence.  All input for a window now goes
+through an ``InputDispatcher``: callers queue actions with a priority
+(``CRITICAL`` < ``CRAFTING`` < ``BUFF``) and one thread executes them, most
+urgent first.  Callers keep the interactor interface by using a
+``DispatchedInteractor``; captures don't need the dispatcher and stay on the
+caller's own interactor (shared through ``rs3_helpers.capture``).
+
+A burst that must not be interleaved (spell key and target click, the start
+keys) is run inside ``exclusive()``: while it is held, the dispatcher serves
+the holder and, between the holder's actions, ``CRITICAL`` ones; everyone else
+waits.  Holds are meant for bursts, not for the flow's long waits.  Actions
+queued together with ``run(priority, *actions)`` execute back to back.
+``activate()`` is skipped while the window has the focus according to the
+focus tracker (``rs3_helpers.focus``); without one, repeated calls within
+``ACTIVATE_DEDUPE_SECONDS`` of the last one are dropped.
+
+XTest input is global, not per window, so the dispatchers of all windows in a
+process execute requests under one lock: an ``activate`` and the ``click``
+queued with it in the same request can't have another window's activation in
+between.
+"""
+
+from contextlib import contextmanager
+import heapq
+import itertools
+import threading
+import time
+
+from x11_interactor import X11WindowInteractor
+
+from rs3_helpers.capture import capture_service
+from rs3_helpers.focus import get_focus_tracker
+
+CRITICAL = 0   # Tick-timed clicks (2-tick actions)
+CRAFTING = 10  # The main crafting/processing flow
+BUFF = 20      # Buff upkeep, can always wait a moment
+
+# Without focus tracking, an activate() this soon after the previous one is assumed redundant
+ACTIVATE_DEDUPE_SECONDS = 1.0
+
+INPUT_ACTIONS = ('activate', 'click', 'send_key')
+
+# Held by a dispatcher thread while it executes a request; shared by every window's dispatcher
+_input_lock = threading.Lock()
+
+
+class _Request:
+    __slots__ = ('actions', 'owner', 'done', 'result', 'error')
+
+    def __init__(self, actions, owner=None):
+        self.actions = actions  # None for a request to hold the dispatcher
+        self.owner = owner
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InputDispatcher:
+    """Executes input actions for one window on a single thread, highest priority first."""
+
+    def __init__(self, interactor_factory, window_id=None, focus=None):
+        self._interactor_factory = interactor_factory
+        self.window_id = window_id
+        self.focus = focus  # FocusTracker, or None to dedupe activate() by time only
+        self._heap = []
+        self._seq = itertools.count()  # FIFO among equal priorities
+        self._cond = threading.Condition()
+        self._holder = None       # Token of the exclusive() holder being served
+        self._held_queue = []     # Requests of that holder
+        self._local = threading.local()
+        self._last_activate = 0.0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, priority, *actions):
+        """Queue ``actions`` (``(name, *args)`` tuples) to run back to back. Returns the request."""
+        holder = getattr(self._local, 'holder', None)
+        request = _Request(actions, holder)
+        with self._cond:
+            if holder is not None and holder == self._holder:
+                self._held_queue.append(request)
+            else:
+                heapq.heappush(self._heap, (priority, next(self._seq), request))
+            self._cond.notify()
+        return request
+
+    def run(self, priority, *actions):
+        """Queue ``actions`` and wait until they ran. Returns the last action's result."""
+        request = self.submit(priority, *actions)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    @contextmanager
+    def exclusive(self, priority):
+        """Hold the dispatcher for a sequence of actions from the calling thread.
+
+        Waits for its turn like any other request at ``priority``; until the
+        block ends, other callers' actions stay queued, except ``CRITICAL``
+        ones, which still run whenever the holder has nothing queued.  Nested
+        use is a no-op.
+        """
+        if getattr(self._local, 'holder', None) is not None:
+            yield
+            return
+        token = object()
+        request = _Request(None, token)
+        with self._cond:
+            heapq.heappush(self._heap, (priority, next(self._seq), request))
+            self._cond.notify()
+        request.done.wait()
+        self._local.holder = token
+        try:
+            yield
+        finally:
+            self._local.holder = None
+            with self._cond:
+                self._holder = None
+                self._cond.notify()
+
+    def _next_request(self):
+        with self._cond:
+            while True:
+                if self._holder is not None:
+                    if self._held_queue:
+                        return self._held_queue.pop(0)
+                    # Tick-timed actions don't wait for a holder sleeping between its actions
+                    if self._heap and self._heap[0][0] <= CRITICAL and self._heap[0][2].actions is not None:
+                        return heapq.heappop(self._heap)[2]
+                elif self._heap:
+                    return heapq.heappop(self._heap)[2]
+                self._cond.wait()
+
+    def _execute(self, interactor, request):
+        result = None
+        for name, *args in request.actions:
+            if name not in INPUT_ACTIONS:
+                raise ValueError(f"Not an input action: {name}")
+            if name == 'activate':
+                if self._has_focus():
+                    continue
+                self._last_activate = time.monotonic()
+                # The focus tracker learns of the new focus from the property event, and only if the
+                # window manager actually granted it
+                result = interactor.activate()
+                continue
+            result = getattr(interactor, name)(*args)
+        return result
+
+    def _has_focus(self):
+        if self.focus is not None and self.focus.available:
+            return self.focus.has_focus(self.window_id)
+        return time.monotonic() - self._last_activate < ACTIVATE_DEDUPE_SECONDS
+
+    def _run(self):
+        # Built on this thread, the interactor's X connection is only ever used from here
+        interactor = self._interactor_factory()
+        while True:
+            request = self._next_request()
+            if request.actions is None:
+                with self._cond:
+                    self._holder = request.owner
+                request.done.set()
+                continue
+            try:
+                with _input_lock:
+                    request.result = self._execute(interactor, request)
+            except Exception as e:
+                request.error = e
+            request.done.set()
+
+
+_dispatchers = {}
+_dispatchers_lock = threading.Lock()
+
+
+def get_dispatcher(window_id):
+    """The process-wide dispatcher for ``window_id``, started on first use."""
+    with _dispatchers_lock:
+        dispatcher = _dispatchers.get(window_id)
+        if dispatcher is None:
+            dispatcher = InputDispatcher(lambda: X11WindowInteractor(window_id=window_id), window_id,
+                                         get_focus_tracker())
+            _dispatchers[window_id] = dispatcher
+        return dispatcher
+
+
+class DispatchedInteractor:
+    """Interactor stand-in whose input goes through the window's dispatcher at a fixed priority.
+
+    Everything else (window_id, ...) is served by ``interactor``, the calling
+    thread's own ``X11WindowInteractor``; captures go through it as well, via
+    the process-wide capture service.
+    """
+
+    def __init__(self, interactor, dispatcher, priority):
+        self.interactor = interactor
+        self.dispatcher = dispatcher
+        self.priority = priority
+
+    def activate(self):
+        return self.dispatcher.run(self.priority, ('activate',))
+
+    def click(self, x, y):
+        return self.dispatcher.run(self.priority, ('click', x, y))
+
+    def send_key(self, key):
+        return self.dispatcher.run(self.priority, ('send_key', key))
+
+    def run(self, *actions):
+        """Run ``actions`` (``(name, *args)`` tuples) back to back, with no other input in between."""
+        return self.dispatcher.run(self.priority, *actions)
+
+    def capture(self, roi=None):
+        return capture_service.capture(self.interactor, roi)
+
+    def exclusive(self):
+        """Keep other callers' input out until the block ends (see ``InputDispatcher.exclusive``)."""
+        return self.dispatcher.exclusive(self.priority)
+
+    def __getattr__(self, name):
+        return getattr(self.interactor, name)
+
+
+def dispatched_interactor(window_id, priority):
+    """A ``DispatchedInteractor`` for ``window_id`` with a fresh interactor for the calling thread."""
+    return DispatchedInteractor(X11WindowInteractor(window_id=window_id), get_dispatcher(window_id), priority)
+
+
+_default_interactor = None
+
+
+def default_interactor():
+    """Interactor for the window ``X11WindowInteractor()`` picks by itself, created on first use.
+
+    The scripts only need it for the target window id, so it is built when
+    they start rather than at import, and shared by all helpers in a process.
+    """
+    global _default_interactor
+    with _dispatchers_lock:
+        if _default_interactor is None:
+            _default_interactor = X11WindowInteractor()
+        return _default_interactor
@@ -0,0 +1,176 @@
+"""Slot-grid model of the inventory (bagpack) ROI.
+
+Instead of template matching an item over the whole inventory capture, the ROI
+is split into its slot grid and every slot is reduced to a fingerprint: a
+hue/saturation histogram plus an 8x8 average hash.  Slots are classified by
+comparing fingerprints against the ones learned for known items, which takes a
+handful of array operations for all 28 slots together.
+
+Item fingerprints are learned from the inventory itself: the first time an item
+is needed the caller confirms it with a full template match and the slot under
+the match is recorded.  Learned fingerprints therefore include the slot
+background and the scale the game is rendered at.  Fingerprints only say where
+to look: ``locate`` still matches the template, but on one slot instead of the
+whole inventory.  Only lookups that find the item get cheaper; when the grid
+sees no such slot (e.g. the last bar is used up) the whole inventory is
+matched as before, since empty and unknown slots can't prove the item absent.
+"""
+
+from collections import Counter
+import threading
+
+import cv2
+import numpy as np
+
+DEFAULT_ROWS = 4
+DEFAULT_COLS = 7
+
+# Fraction of the slot cut away on every side (slot borders, stack numbers sit in the corner)
+SLOT_MARGIN = 0.12
+THUMB_SIZE = 16
+HASH_SIZE = 8
+HUE_BINS = 18
+SAT_BINS = 4
+
+# A slot is an item when both its histogram and its hash are close enough
+MIN_HIST_INTERSECTION = 0.7
+MAX_HASH_DISTANCE = 10
+# Fingerprints kept per item (different looks, e.g. after the ROI was recalibrated)
+MAX_FINGERPRINTS = 4
+
+
+def _drop_alpha(image):
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    if image.shape[2] == 4:
+        return image[:, :, :3]
+    return image
+
+
+class InventoryGrid:
+    """Slot grid over an inventory capture, with per-slot item classification."""
+
+    def __init__(self, rows=DEFAULT_ROWS, cols=DEFAULT_COLS, margin=SLOT_MARGIN):
+        self.rows = rows
+        self.cols = cols
+        self.margin = margin
+        self._items = {}  # name -> (hists (K, bins), hashes (K, 64))
+        self._slots = {}  # capture shape -> list of (x, y, w, h)
+        self._lock = threading.Lock()
+
+    def slots(self, shape):
+        """Slot bboxes ``(x, y, w, h)`` for a capture of ``shape``, row by row."""
+        key = tuple(shape[:2])
+        slots = self._slots.get(key)
+        if slots is None:
+            ys = np.linspace(0, shape[0], self.rows + 1).astype(int)
+            xs = np.linspace(0, shape[1], self.cols + 1).astype(int)
+            slots = [(int(xs[c]), int(ys[r]), int(xs[c + 1] - xs[c]), int(ys[r + 1] - ys[r]))
+                     for r in range(self.rows) for c in range(self.cols)]
+            self._slots[key] = slots
+        return slots
+
+    def slot_at(self, shape, x, y):
+        """Index of the slot containing point ``(x, y)``, or None if it is outside the grid."""
+        if not (0 <= x < shape[1] and 0 <= y < shape[0]):
+            return None
+        col = min(int(x * self.cols / shape[1]), self.cols - 1)
+        row = min(int(y * self.rows / shape[0]), self.rows - 1)
+        return row * self.cols + col
+
+    def fingerprints(self, image):
+        """Histograms ``(N, bins)`` and average hashes ``(N, 64)`` of every slot in ``image``."""
+        image = _drop_alpha(image)
+        thumbs = []
+        for x, y, w, h in self.slots(image.shape):
+            mx, my = int(w * self.margin), int(h * self.margin)
+            crop = image[y + my:y + h - my, x + mx:x + w - mx]
+            thumbs.append(cv2.resize(crop, (THUMB_SIZE, THUMB_SIZE), interpolation=cv2.INTER_AREA))
+        n = len(thumbs)
+        # All slots in one tall image, so colour conversion and resizing run once
+        stacked = np.ascontiguousarray(np.concatenate(thumbs, axis=0))
+
+        hsv = cv2.cvtColor(stacked, cv2.COLOR_BGR2HSV).reshape(n, -1, 3)
+        hue, sat = hsv[:, :, 0].astype(np.int32), hsv[:, :, 1].astype(np.int32)
+        bins = (hue * HUE_BINS // 180) * SAT_BINS + sat * SAT_BINS // 256
+        bins += (np.arange(n) * HUE_BINS * SAT_BINS)[:, None]
+        hists = np.bincount(bins.ravel(), minlength=n * HUE_BINS * SAT_BINS).reshape(n, -1)
+        hists = hists / float(THUMB_SIZE * THUMB_SIZE)
+
+        gray = cv2.cvtColor(stacked, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, (HASH_SIZE, HASH_SIZE * n), interpolation=cv2.INTER_AREA).reshape(n, -1)
+        hashes = small > small.mean(axis=1, keepdims=True)
+        return hists, hashes
+
+    def knows(self, name):
+        """Whether a fingerprint was learned for ``name``."""
+        return name in self._items
+
+    def learn(self, image, bbox, name):
+        """Record the slot under ``bbox`` (relative to ``image``) as item ``name``."""
+        x, y, w, h = bbox
+        index = self.slot_at(image.shape, x + w / 2, y + h / 2)
+        if index is None:
+            return
+        hists, hashes = self.fingerprints(image)
+        with self._lock:
+            known = self._items.get(name)
+            if known is None:
+                known = (hists[index:index + 1], hashes[index:index + 1])
+            else:
+                known = (np.vstack([known[0], hists[index:index + 1]])[-MAX_FINGERPRINTS:],
+                         np.vstack([known[1], hashes[index:index + 1]])[-MAX_FINGERPRINTS:])
+            self._items[name] = known
+
+    def classify(self, image):
+        """Item name (or None) for every slot of ``image``, row by row."""
+        hists, hashes = self.fingerprints(image)
+        labels = [None] * len(hists)
+        best = np.full(len(hists), -1.0)
+        with self._lock:
+            items = list(self._items.items())
+        for name, (item_hists, item_hashes) in items:
+            # (N, K): every slot against every fingerprint of the item
+            intersection = np.minimum(hists[:, None, :], item_hists[None, :, :]).sum(axis=2)
+            distance = (hashes[:, None, :] != item_hashes[None, :, :]).sum(axis=2)
+            score = np.where((intersection >= MIN_HIST_INTERSECTION) & (distance <= MAX_HASH_DISTANCE),
+                             intersection, -1.0).max(axis=1)
+            for i in np.flatnonzero(score > best):
+                labels[i] = name
+            best = np.maximum(best, score)
+        return labels
+
+    def find(self, image, name):
+        """Bbox ``(x, y, w, h)`` of the first slot holding ``name``, or None."""
+        for label, slot in zip(self.classify(image), self.slots(image.shape)):
+            if label == name:
+                return slot
+        return None
+
+    def counts(self, image):
+        """Counter of items in ``image`` by name (unrecognised slots count under None)."""
+        return Counter(self.classify(image))
+
+    def locate(self, name, image, confirm):
+        """Bbox of the matched ``name`` in ``image``, or None.
+
+        ``confirm(image)`` runs the template match and returns a bbox or None.
+        A slot the grid finds is confirmed on that slot alone (padded by half a
+        slot), so a fingerprint false positive is never returned and the bbox
+        is the item's, not the slot's.  The whole image is matched while
+        ``name`` is unknown, the grid sees no such slot or the slot doesn't
+        confirm; a match there teaches the grid the slot's look.
+        """
+        if self.knows(name):
+            slot = self.find(image, name)
+            if slot is not None:
+                x, y, w, h = slot
+                x0, y0 = max(x - w // 2, 0), max(y - h // 2, 0)
+                x1, y1 = min(x + w + w // 2, image.shape[1]), min(y + h + h // 2, image.shape[0])
+                bbox = confirm(np.ascontiguousarray(image[y0:y1, x0:x1]))
+                if bbox is not None:
+                    return (bbox[0] + x0, bbox[1] + y0, bbox[2], bbox[3])
+        bbox = confirm(image)
+        if bbox is not None:
+            self.learn(image, bbox, name)
+        return bbox
@@ -0,0 +1,93 @@
+"""Prebuilt EasyOCR reader snapshots.
+
+``easyocr.Reader(...)`` reads the model files and builds the detector and
+recogniser networks on every launch.  The compile step saves an initialised
+reader once with ``torch.save``; ``load_snapshot`` brings it back with
+``torch.load(mmap=True)``, so the weights are mapped from the file instead of
+networks being built and filled again.
+
+Build (or refresh) the snapshot for the languages and device OCR runs with:
+
+    python -m rs3_helpers.ocr_snapshot [--languages en ...] [--cpu]
+
+Each snapshot has a ``.json`` sidecar recording the easyocr and torch versions,
+languages, device and the snapshot's size and mtime.  A snapshot whose sidecar
+doesn't match (library upgrade, file replaced, other device) is ignored and
+the reader is built the normal way.
+"""
+
+import argparse
+import json
+import os
+
+SNAPSHOT_DIR = os.path.join(os.environ.get('EASYOCR_MODULE_PATH', os.path.expanduser('~/.EasyOCR')), 'snapshots')
+
+
+def _device(gpu):
+    import torch
+    return 'cuda' if gpu and torch.cuda.is_available() else 'cpu'
+
+
+def snapshot_path(languages, device):
+    return os.path.join(SNAPSHOT_DIR, f"reader-{'-'.join(languages)}-{device}.pt")
+
+
+def _metadata(languages, device):
+    import easyocr
+    import torch
+    return {'easyocr': easyocr.__version__, 'torch': torch.__version__, 'languages': list(languages), 'device': device}
+
+
+def save_snapshot(reader, languages, device):
+    """Write ``reader`` and its sidecar. Returns the snapshot path."""
+    import torch
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = snapshot_path(languages, device)
+    torch.save(reader, path)
+    stat = os.stat(path)
+    metadata = dict(_metadata(languages, device), size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    with open(path + '.json', 'w') as f:
+        json.dump(metadata, f, indent=4)
+    return path
+
+
+def load_snapshot(languages, gpu=True):
+    """The reader saved for ``languages`` on the device ``gpu`` resolves to, or None if there is no valid snapshot."""
+    device = _device(gpu)
+    path = snapshot_path(languages, device)
+    try:
+        with open(path + '.json', 'r') as f:
+            metadata = json.load(f)
+        stat = os.stat(path)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if metadata != dict(_metadata(languages, device), size=stat.st_size, mtime_ns=stat.st_mtime_ns):
+        print(f"OCR snapshot {path} is out of date, rebuild it with: python -m rs3_helpers.ocr_snapshot")
+        return None
+
+    import torch
+    try:
+        return torch.load(path, map_location=device, mmap=True, weights_only=False)
+    except Exception as e:
+        print(f"Error loading OCR snapshot {path}: {e}")
+        return None
+
+
+def main():
+    import easyocr
+
+    parser = argparse.ArgumentParser(description="Save an initialised EasyOCR reader for fast startup.")
+    parser.add_argument('--languages', nargs='+', default=['en'], help="Reader languages (default: en)")
+    parser.add_argument('--cpu', action='store_true', help="Build the CPU snapshot even if a GPU is available")
+    args = parser.parse_args()
+
+    device = _device(not args.cpu)
+    print(f"Initializing EasyOCR with languages: {args.languages}, device: {device}")
+    reader = easyocr.Reader(args.languages, gpu=device == 'cuda')
+    path = save_snapshot(reader, args.languages, device)
+    print(f"Saved {path} ({os.path.getsize(path) / 2**20:.0f} MiB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Phase announcements from the crafting flow.
+
+Background tasks used to poll flags like ``in_smithing_loop`` to find out what
+the main loop was doing.  The main loop now publishes its phase on a
+``PhaseBus`` whenever it changes, and subscribers (e.g. the buff scheduler)
+are called right away, so work gated on a phase starts the moment the phase
+begins.
+
+Alongside the phase the flow marks its idle windows (``waiting=True``): the
+stretches where it only sleeps while the game works, e.g. the 16 s on the
+anvil.  Keypresses sent then can't land in the middle of a click sequence.
+"""
+
+import threading
+
+# Phases of the crafting flows
+IDLE = 'idle'              # Between tasks, or not running
+FORGE = 'forge'            # Smithing: forge interface, choosing bar/item/tier, starting
+ANVIL = 'anvil'            # Smithing: first pass on the anvil
+HEATING = 'heating'        # Smithing: superheat/reheat loop until the bars run out
+SETUP = 'setup'            # Processing: clicking through the crafting interface
+PROCESSING = 'processing'  # Processing: waiting for the progress bar to fill
+BANKING = 'banking'        # Processing: loading the bank preset
+
+
+class PhaseBus:
+    """Current phase and idle-window flag, with subscribers called on every change."""
+
+    def __init__(self, phase=IDLE):
+        self.phase = phase
+        self.waiting = False
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """Call ``callback(phase, waiting)`` on every change. Returns a function that unsubscribes."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def publish(self, phase, waiting=False):
+        """Announce ``phase``, ``waiting`` if the flow now just sleeps until the game is done.
+
+        Subscribers are called (on this thread) only if something changed.
+        """
+        with self._lock:
+            if (phase, waiting) == (self.phase, self.waiting):
+                return
+            self.phase = phase
+            self.waiting = waiting
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(phase, waiting)
@@ -0,0 +1,91 @@
+"""Running/paused state of a helper script that threads can block on.
+
+The helpers used to share two module globals, ``script_running`` and
+``script_paused``, and every sleeping thread re-checked them every 100 ms.
+``RunState`` keeps the same two flags behind a condition variable: every change
+wakes all waiters at once, so F12 and F11 take effect immediately and an idle
+thread doesn't wake up until its sleep is over or the state changes.
+"""
+
+import threading
+import time
+
+
+class RunState:
+    """Start/stop/pause flags with blocking waits on them."""
+
+    def __init__(self):
+        # Also used by other waiters (e.g. the buff scheduler) that must react to stop/pause
+        self.condition = threading.Condition()
+        self._running = False
+        self._paused = False
+        self._listeners = []
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def paused(self):
+        return self._paused
+
+    def add_listener(self, callback):
+        """Call ``callback(running, paused)`` on every change (for waiters that can't block on the condition)."""
+        with self.condition:
+            self._listeners.append(callback)
+
+    def _set(self, update):
+        """Apply ``update(running, paused) -> (running, paused)`` atomically, then call the listeners.
+
+        Listeners run after the condition is released, so they may take their
+        own locks or query the state without holding up waiters.
+        """
+        with self.condition:
+            running, paused = update(self._running, self._paused)
+            self._running, self._paused = running, paused
+            self.condition.notify_all()
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback(running, paused)
+        return running, paused
+
+    def start(self):
+        self._set(lambda running, paused: (True, False))
+
+    def stop(self):
+        self._set(lambda running, paused: (False, False))
+
+    def pause(self):
+        self._set(lambda running, paused: (running, True))
+
+    def resume(self):
+        self._set(lambda running, paused: (running, False))
+
+    def toggle_pause(self):
+        """Pause if running, resume if paused. Returns the new paused state."""
+        return self._set(lambda running, paused: (running, not paused))[1]
+
+    def wait_while_paused(self):
+        """Block while paused. Returns False once the script is stopped."""
+        with self.condition:
+            while self._running and self._paused:
+                self.condition.wait()
+            return self._running
+
+    def sleep(self, duration):
+        """Sleep for ``duration`` seconds, returning early (False) if the script is stopped.
+
+        Time spent paused counts towards the duration, but the sleep doesn't
+        end while paused.  Returns True if the script is still running.
+        """
+        deadline = time.monotonic() + duration
+        with self.condition:
+            while self._running:
+                remaining = deadline - time.monotonic()
+                if self._paused:
+                    self.condition.wait()
+                elif remaining > 0:
+                    self.condition.wait(remaining)
+                else:
+                    return True
+            return False
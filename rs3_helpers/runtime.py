@@ -0,0 +1,156 @@
+"""asyncio runtime for the monitoring loops.
+
+Each OCR monitor or buff loop used to be an OS thread sleeping in a
+``while running`` loop.  ``AsyncRuntime`` runs them as coroutines on one event
+loop thread instead; the blocking parts (screen capture, OCR, template
+matching, input) are handed to small thread pools sized per kind of work, so
+dozens of monitors cost one loop thread plus those pools.
+
+The runtime follows the script's ``RunState``: ``sleep`` and
+``wait_while_paused`` behave like their ``RunState`` counterparts, and a stop
+cancels every running coroutine straight away.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import threading
+
+from rs3_helpers.input_dispatch import dispatched_interactor
+
+# Threads per kind of blocking work
+CAPTURE = 'capture'
+OCR = 'ocr'
+MATCH = 'match'
+INPUT = 'input'
+POOL_SIZES = {
+    CAPTURE: 2,
+    OCR: 2,
+    MATCH: 2,
+    INPUT: 4,  # Only wait for the input dispatcher, which serialises the actions anyway
+}
+
+
+class AsyncRuntime:
+    """Event loop thread running monitor coroutines for one script."""
+
+    def __init__(self, run_state, pool_sizes=None):
+        self.run_state = run_state
+        self.pool_sizes = dict(POOL_SIZES, **(pool_sizes or {}))
+        self._pools = {}
+        self._loop = None
+        self._tasks = set()
+        self._changed = None  # asyncio.Event, set (and replaced) on every run-state change
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        run_state.add_listener(self._on_state_change)
+
+    # --- Loop thread ---
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                ready = threading.Event()
+                threading.Thread(target=self._run_loop, args=(ready,), daemon=True).start()
+                ready.wait()
+            return self._loop
+
+    def _run_loop(self, ready):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._changed = asyncio.Event()
+        self._loop = loop
+        ready.set()
+        loop.run_forever()
+
+    def _on_state_change(self, running, paused):
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._state_changed, running)
+
+    def _state_changed(self, running):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+        if not running:
+            for task in list(self._tasks):
+                task.cancel()
+
+    # --- Coroutines ---
+    def spawn(self, coro_fn, *args, name=None):
+        """Run ``coro_fn(*args)`` on the loop (callable from any thread). Returns a concurrent future."""
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self._guard(coro_fn(*args), name or coro_fn.__name__), loop)
+
+    async def _guard(self, coro, name):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            return await coro
+        except asyncio.CancelledError:
+            print(f"{name}: cancelled.")
+        except Exception as e:
+            print(f"Error in {name}: {e}")
+        finally:
+            self._tasks.discard(task)
+
+    async def sleep(self, seconds):
+        """Sleep unless the script stops first (False); time paused counts, but a pause holds the sleep."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + seconds
+        while self.run_state.running:
+            changed = self._changed
+            if self.run_state.paused:
+                await changed.wait()
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return True
+            try:
+                await asyncio.wait_for(changed.wait(), remaining)
+            except TimeoutError:
+                pass
+        return False
+
+    async def wait_while_paused(self):
+        """Wait while paused. Returns False once the script is stopped."""
+        while self.run_state.running and self.run_state.paused:
+            await self._changed.wait()
+        return self.run_state.running
+
+    # --- Blocking work ---
+    def _pool(self, kind):
+        with self._lock:
+            pool = self._pools.get(kind)
+            if pool is None:
+                pool = ThreadPoolExecutor(max_workers=self.pool_sizes[kind], thread_name_prefix=f"rs3-{kind}")
+                self._pools[kind] = pool
+            return pool
+
+    def set_pool_size(self, kind, workers):
+        """Resize the ``kind`` pool (e.g. one capture thread per window); takes effect for new calls."""
+        with self._lock:
+            if self.pool_sizes.get(kind) == workers:
+                return
+            self.pool_sizes[kind] = workers
+            pool = self._pools.pop(kind, None)
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    async def call(self, kind, fn, *args, **kwargs):
+        """Run blocking ``fn`` in the ``kind`` pool (CAPTURE, OCR, MATCH or INPUT) and await its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool(kind), functools.partial(fn, *args, **kwargs))
+
+    def interactor(self, window_id, priority):
+        """The calling pool thread's own ``DispatchedInteractor`` for ``window_id`` at ``priority``.
+
+        Interactors keep their X connection per thread, so functions run
+        through ``call`` get theirs from here instead of sharing one.
+        """
+        interactors = getattr(self._local, 'interactors', None)
+        if interactors is None:
+            interactors = self._local.interactors = {}
+        key = (window_id, priority)
+        interactor = interactors.get(key)
+        if interactor is None:
+            interactor = interactors[key] = dispatched_interactor(window_id, priority)
+        return interactor
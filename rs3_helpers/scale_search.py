@@ -0,0 +1,261 @@
+"""Scale search for the template matchers.
+
+``ColorMatcher`` and ``CannyEdgeMatcher`` walk their whole scale range inside a
+single ``match()`` call, on one core.  ``search_scale`` finds the best scale up
+front instead - optionally split across a process pool, with the target image
+handed to the workers through shared memory - so the matcher itself only has to
+run once, at the winning scale.
+"""
+
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from rs3_helpers.template_pyramid import load_pyramid, resize_to_scale
+
+# Same scale range the helpers build their matchers with
+DEFAULT_MIN_SCALE = 0.5
+DEFAULT_MAX_SCALE = 2.0
+DEFAULT_NUM_SCALES = 150
+
+# Process pool shared by every search in this process
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+# Raw templates by path, filled lazily (workers keep their own copy)
+_templates = {}
+
+
+def make_scales(min_scale=DEFAULT_MIN_SCALE, max_scale=DEFAULT_MAX_SCALE, num_scales=DEFAULT_NUM_SCALES):
+    """Return the scale range a matcher built with the same arguments walks."""
+    return np.linspace(min_scale, max_scale, num_scales)
+
+
+def load_template(template_path):
+    """Load (and cache) a template image as BGR."""
+    template = _templates.get(template_path)
+    if template is None:
+        template = cv2.imread(template_path, cv2.IMREAD_COLOR)
+        if template is None:
+            return None
+        _templates[template_path] = template
+    return template
+
+
+def prepare_image(image, mode='color', canny_thresholds=(25, 50)):
+    """Convert an image to the representation the search scores in.
+
+    'color' keeps three channels (alpha from captures is dropped), 'canny'
+    reduces the image to its edge map like ``CannyEdgeMatcher`` does.
+    """
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    elif image.shape[2] == 4:
+        image = image[:, :, :3]
+
+    if mode == 'canny':
+        gray = cv2.cvtColor(np.ascontiguousarray(image), cv2.COLOR_BGR2GRAY)
+        return cv2.Canny(gray, canny_thresholds[0], canny_thresholds[1])
+    return np.ascontiguousarray(image)
+
+
+def scaled_template(template_path, scale, mode='color', canny_thresholds=(25, 50)):
+    """The template at ``scale``, prepared for ``mode``.
+
+    Sliced from the template's pyramid bundle when one is built, resized on the
+    fly otherwise.  None if the template is missing or collapses at this scale.
+    """
+    pyramid = load_pyramid(template_path)
+    if pyramid is not None:
+        scaled = pyramid.get(scale, mode, canny_thresholds)
+        if scaled is not None:
+            return scaled
+
+    template = load_template(template_path)
+    if template is None:
+        return None
+    resized = resize_to_scale(template, scale)
+    if resized is None:
+        return None
+    return prepare_image(resized, mode, canny_thresholds)
+
+
+def score_at_scale(template_path, target, scale, mode='color', canny_thresholds=(25, 50)):
+    """Best normalised correlation of the template at ``scale`` inside ``target``.
+
+    ``target`` must already be prepared.  Returns -1.0 when the scaled template
+    does not fit into the target.
+    """
+    scaled = scaled_template(template_path, scale, mode, canny_thresholds)
+    if scaled is None or scaled.shape[0] > target.shape[0] or scaled.shape[1] > target.shape[1]:
+        return -1.0
+
+    result = cv2.matchTemplate(target, scaled, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, _ = cv2.minMaxLoc(result)
+    if not np.isfinite(max_val):  # Flat template (e.g. no edges at this scale)
+        return -1.0
+    return float(max_val)
+
+
+def _best_scale(template_path, target, scales, mode, canny_thresholds):
+    """Best (scale, correlation) over ``scales``."""
+    if load_template(template_path) is None:
+        return None, -1.0
+
+    best_scale, best_corr = None, -1.0
+    for scale in scales:
+        corr = score_at_scale(template_path, target, scale, mode, canny_thresholds)
+        if corr > best_corr:
+            best_scale, best_corr = float(scale), corr
+    return best_scale, best_corr
+
+
+# --- Process pool ---
+def _init_worker():
+    # Parallelism comes from the pool; keep OpenCV's own thread pool out of the workers
+    cv2.setNumThreads(1)
+
+
+def _score_chunk(shm_name, shape, dtype, template_path, scales, mode, canny_thresholds):
+    """Worker entry point: score a slice of the scale range against the shared target."""
+    shm = shared_memory.SharedMemory(name=shm_name, track=False)
+    try:
+        # No named reference to the view, so nothing pins the buffer when it is closed
+        return _best_scale(template_path, np.ndarray(shape, dtype=dtype, buffer=shm.buf),
+                           scales, mode, canny_thresholds)
+    finally:
+        shm.close()
+
+
+def _get_pool(workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            # Not fork: by now the process runs the listener, dispatcher and runtime threads (and
+            # OpenCV's), and a forked child can deadlock on a lock one of them held. The forkserver
+            # is single-threaded; workers import the script again, its __main__ block doesn't run.
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('forkserver'),
+                initializer=_init_worker,
+            )
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool():
+    """Stop the worker processes (called automatically at exit)."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool, _pool_workers = None, 0
+
+
+atexit.register(shutdown_pool)
+
+
+def _parallel_best_scale(template_path, target, scales, mode, canny_thresholds, workers):
+    pool = _get_pool(workers)
+    shm = shared_memory.SharedMemory(create=True, size=target.nbytes)
+    try:
+        shared_target = np.ndarray(target.shape, dtype=target.dtype, buffer=shm.buf)
+        shared_target[:] = target
+        del shared_target
+
+        # Interleave the scales so every worker gets a mix of small and large (expensive) ones
+        chunks = [scales[i::workers] for i in range(workers)]
+        futures = [
+            pool.submit(_score_chunk, shm.name, target.shape, target.dtype.str,
+                        template_path, chunk, mode, canny_thresholds)
+            for chunk in chunks
+        ]
+        best_scale, best_corr = None, -1.0
+        for future in futures:
+            scale, corr = future.result()
+            if scale is not None and corr > best_corr:
+                best_scale, best_corr = scale, corr
+        return best_scale, best_corr
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def search_scale(template_path, target, scales=None, mode='color', canny_thresholds=(25, 50), workers=None):
+    """Find the scale at which ``template_path`` correlates best with ``target``.
+
+    With ``workers`` > 1 the scale range is split across a process pool.
+    Returns ``(scale, correlation)``; scale is None if the template could not be
+    loaded or does not fit into the target at any scale.
+    """
+    if scales is None:
+        scales = make_scales()
+    scales = np.asarray(scales, dtype=np.float64)
+    prepared = prepare_image(target, mode, canny_thresholds)
+    if load_template(template_path) is None:
+        return None, -1.0
+
+    if workers and workers > 1 and len(scales) > workers:
+        try:
+            return _parallel_best_scale(template_path, prepared, scales, mode, canny_thresholds, workers)
+        except Exception as e:
+            print(f"Parallel scale search failed ({e}). Falling back to a serial search.")
+            shutdown_pool()
+    return _best_scale(template_path, prepared, scales, mode, canny_thresholds)
+
+
+def match_first_hit(matcher, template_path, target, scales=None, around=1.0):
+    """Run ``matcher`` scale by scale, nearest to ``around`` first, until it detects the template.
+
+    Hit or miss is the matcher's own decision (its metric and
+    ``match_threshold``), not a correlation computed here.  A hit is then
+    moved to whichever neighbouring scale the matcher scores higher, so the
+    scale callers cache is a local best rather than the first that passed.
+    Returns the matcher's usual 5-tuple.
+    """
+    grid = np.sort(make_scales() if scales is None else np.asarray(scales, dtype=np.float64))
+    match = lambda i: matcher.match(template_input=template_path, target_input=target, scale=float(grid[i]))
+    for index in np.argsort(np.abs(grid - around), kind='stable'):
+        result = match(index)
+        if result[4] == 'Detected':
+            break
+    else:
+        return result  # Not detected at any scale
+
+    index = int(index)
+    while True:
+        best, best_index = result, index
+        for i in (index - 1, index + 1):
+            if 0 <= i < len(grid):
+                candidate = match(i)
+                if candidate[4] == 'Detected' and candidate[3] > best[3]:
+                    best, best_index = candidate, i
+        if best_index == index:
+            return result
+        result, index = best, best_index
+
+
+def match_cold(matcher, template_path, target, workers=None, first_hit=False, around=1.0, **search_kwargs):
+    """Run ``matcher`` on a template whose scale is not known yet.
+
+    ``first_hit`` is for presence checks: see ``match_first_hit``.  Otherwise,
+    without ``workers`` the matcher scans its scale range itself, as before;
+    with them the scale is found with ``search_scale`` first and the matcher
+    only runs at that scale.
+    Returns the matcher's usual 5-tuple.
+    """
+    if first_hit:
+        return match_first_hit(matcher, template_path, target, around=around)
+    if workers:
+        scale, _ = search_scale(template_path, target, workers=workers, **search_kwargs)
+        if scale is not None:
+            return matcher.match(template_input=template_path, target_input=target, scale=scale)
+    return matcher.match(template_input=template_path, target_input=target)
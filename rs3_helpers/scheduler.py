@@ -0,0 +1,181 @@
+"""One timer thread for all recurring buff keypresses.
+
+The helpers used to run a thread per buff, each waking several times a second
+to compare the clock with a deadline minutes away.  ``BuffScheduler`` keeps
+every buff's next activation in a heap and sleeps on the script's run-state
+condition until the earliest one is due, or until stop/pause/resume wakes it.
+
+Buffs that may only fire in certain phases of the crafting flow (powerburst
+while smithing) are parked when they fall due outside them, and put back the
+moment the ``PhaseBus`` announces one of their phases.  With a ``slack`` the
+scheduler also holds due buffs for up to that many seconds until the flow
+enters an idle window, so buff keys don't interleave with its clicks.
+"""
+
+import heapq
+import itertools
+import random
+import threading
+import time
+
+# How long to hold off after a keypress before the next one (the game drops overlapping inputs)
+AFTER_ACTIVATION_DELAY = (0.6, 0.8)
+
+
+def _clock(t):
+    return time.strftime('%H:%M:%S', time.localtime(t))
+
+
+class BuffJob:
+    """A buff that is re-activated every ``interval`` seconds (a (min, max) range, picked at random).
+
+    ``presses``: how many times the key is sent per activation.
+    ``activate_now``: activate as soon as the scheduler starts, unless ``initial_wait`` is set.
+    ``phases``: optional set of phases (``rs3_helpers.phases``) the buff may
+    fire in; when due in any other phase it waits for one of them.
+    """
+
+    def __init__(self, name, key, interval, initial_wait=0, activate_now=True, presses=1, phases=None):
+        self.name = name
+        self.key = key
+        self.interval = interval
+        self.initial_wait = initial_wait
+        self.activate_now = activate_now
+        self.presses = presses
+        self.phases = frozenset(phases) if phases is not None else None
+        self.last_activation = None
+
+    def next_interval(self):
+        return random.uniform(*self.interval)
+
+
+class BuffScheduler:
+    """Runs ``BuffJob``s from a single thread, sleeping until the earliest one is due.
+
+    The scheduler ends when ``run_state`` (a ``rs3_helpers.run_state.RunState``)
+    is stopped and holds activations while it is paused.  ``phase_bus`` is
+    needed for jobs restricted to ``phases`` and for ``slack``: the most a due
+    buff is postponed to wait for the flow's next idle window (0 disables it).
+    """
+
+    def __init__(self, interactor, run_state, phase_bus=None, slack=0):
+        self.interactor = interactor
+        self.run_state = run_state
+        self.phase_bus = phase_bus
+        self.slack = slack if phase_bus is not None else 0
+        self._heap = []
+        self._parked = []  # Due jobs waiting for one of their phases
+        self._held = {}  # Due job -> time it fires even without an idle window
+        self._seq = itertools.count()  # Tie-breaker, jobs themselves don't compare
+        # Shared with the run state, so stop/pause/resume wake the scheduler directly
+        self._cond = run_state.condition
+        self._thread = None
+        self._unsubscribe = phase_bus.subscribe(self._on_phase) if phase_bus is not None else None
+
+    def add(self, job):
+        """Schedule ``job`` according to its initial wait / immediate activation settings."""
+        now = time.time()
+        if job.initial_wait > 0:
+            due = now + job.initial_wait
+            print(f"{job.name}: Initial wait set. Next check/activation around {_clock(due)}")
+        elif job.activate_now and not self.run_state.paused:
+            due = now
+        else:
+            # Started paused, or the buff shouldn't fire right away: pretend it just activated
+            job.last_activation = now
+            due = now + job.next_interval()
+            print(f"{job.name}: Scheduling first activation around {_clock(due)}")
+        self._push(due, job)
+
+    def _push(self, due, job):
+        with self._cond:
+            heapq.heappush(self._heap, (due, next(self._seq), job))
+            self._cond.notify_all()  # The condition is shared, make sure the scheduler is among the woken
+
+    def _on_phase(self, phase, waiting):
+        with self._cond:
+            ready = [job for job in self._parked if phase in job.phases]
+            now = time.time()
+            for job in ready:
+                self._parked.remove(job)
+                heapq.heappush(self._heap, (now, next(self._seq), job))
+            if waiting and self._held:
+                # Idle window: held jobs are due right away
+                self._heap = [(now if job in self._held else due, seq, job) for due, seq, job in self._heap]
+                heapq.heapify(self._heap)
+                ready = True
+            if ready:
+                self._cond.notify_all()
+
+    def _phase_allows(self, job):
+        return job.phases is None or self.phase_bus is None or self.phase_bus.phase in job.phases
+
+    def _hold(self, job):
+        """Put a due ``job`` back until the next idle window or its slack runs out. False to fire it now."""
+        if not self.slack or self.phase_bus.waiting:
+            self._held.pop(job, None)
+            return False
+        now = time.time()
+        deadline = self._held.get(job)
+        if deadline is None:
+            deadline = self._held[job] = now + self.slack
+            print(f"{job.name}: Due, holding up to {self.slack:.0f}s for an idle window...")
+        elif now >= deadline:
+            del self._held[job]
+            print(f"{job.name}: No idle window within {self.slack:.0f}s, activating anyway.")
+            return False
+        heapq.heappush(self._heap, (deadline, next(self._seq), job))
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def _next_due_job(self):
+        """Block until a job is due; None once the script stopped."""
+        with self._cond:
+            while self.run_state.running:
+                if self.run_state.paused or not self._heap:
+                    self._cond.wait()
+                    continue
+                timeout = self._heap[0][0] - time.time()
+                if timeout <= 0:
+                    job = heapq.heappop(self._heap)[2]
+                    if not self._phase_allows(job):
+                        print(f"{job.name}: Due, waiting for phase {'/'.join(sorted(job.phases))}...")
+                        self._held.pop(job, None)
+                        self._parked.append(job)
+                        continue
+                    if self._hold(job):
+                        continue
+                    return job
+                self._cond.wait(timeout)
+        return None
+
+    def _activate(self, job):
+        print(f"Activating {job.name}...")
+        for _ in range(job.presses):
+            self.interactor.send_key(job.key)
+        job.last_activation = time.time()
+        due = job.last_activation + job.next_interval()
+        print(f"{job.name}: Next activation scheduled around {_clock(due)}")
+        return due
+
+    def _run(self):
+        print(f"Buff scheduler started ({len(self._heap)} buffs).")
+        while True:
+            job = self._next_due_job()
+            if job is None:
+                break
+            try:
+                due = self._activate(job)
+            except Exception as e:
+                print(f"Error activating {job.name}: {e}")
+                due = time.time() + 5
+            self._push(due, job)
+            # Space out keypresses of buffs that fall due together
+            self.run_state.sleep(random.uniform(*AFTER_ACTIVATION_DELAY))
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+        print("Buff scheduler finished.")
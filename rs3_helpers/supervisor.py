@@ -0,0 +1,88 @@
+"""Run several helper scripts in one process.
+
+``python main.py buffer 2ticker`` loads the named helpers as modules (their
+``__main__`` blocks don't run) and starts a single hotkey listener that
+forwards F10/F11/F12 to each of them in turn, so they configure, start, pause
+and stop together.  Living in one process, they share the input dispatcher and
+focus tracker per window, the capture service, the matchers and the scale
+cache instead of each holding their own.
+"""
+
+import importlib.util
+import os
+import sys
+
+import pynput.keyboard as pkeyboard
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (script, hotkey handler, setup function run once before listening)
+HELPERS = {
+    'buffer': ('auto-buffer/main.py', 'on_press', None),
+    '2ticker': ('auto-2ticker/main.py', 'on_press', None),
+    'smithing': ('auto-smithing/main.py', 'on_press', None),
+    'progress': ('auto-progress-processing/main.py', 'on_press_key_event', 'load_startup_settings'),
+}
+
+HOTKEYS = (pkeyboard.Key.f10, pkeyboard.Key.f11, pkeyboard.Key.f12)
+
+# Seconds between two rounds of drawing the helpers' debug viewers on the main thread
+PUMP_INTERVAL = 0.05
+
+
+def load_helper(name):
+    """Import a helper script as module ``rs3_<name>`` and run its setup. Returns (module, handler)."""
+    script, handler_name, setup_name = HELPERS[name]
+    path = os.path.join(REPO_ROOT, script)
+    spec = importlib.util.spec_from_file_location(f"rs3_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    if setup_name:
+        getattr(module, setup_name)()
+    return module, getattr(module, handler_name)
+
+
+class Supervisor:
+    """Loaded helpers sharing one hotkey listener."""
+
+    def __init__(self, names):
+        self.helpers = []
+        for name in names:
+            print(f"Loading helper '{name}'...")
+            module, handler = load_helper(name)
+            self.helpers.append((name, module, handler))
+
+    def on_press(self, key):
+        if key not in HOTKEYS:
+            return
+        # In order, so their configuration prompts don't interleave
+        for name, _, handler in self.helpers:
+            print(f"\n=== {name} ===")
+            try:
+                handler(key)
+            except Exception as e:
+                print(f"Error in helper '{name}' handling {key}: {e}")
+
+    def run(self):
+        print(f"\nSupervising: {', '.join(name for name, _, _ in self.helpers)}")
+        print("Press F10 to recalibrate, F11 to configure and start/pause, F12 to stop (all helpers).")
+        # Helpers that draw debug windows (the progress helper's debug_viewer) need the main thread for it
+        viewers = [module.debug_viewer for _, module, _ in self.helpers if hasattr(module, 'debug_viewer')]
+        with pkeyboard.Listener(on_press=self.on_press) as listener:
+            while listener.is_alive():
+                for viewer in viewers:
+                    viewer.pump()
+                listener.join(PUMP_INTERVAL)
+
+
+def main(argv=None):
+    names = list(dict.fromkeys(sys.argv[1:] if argv is None else argv))
+    unknown = [name for name in names if name not in HELPERS]
+    if not names or unknown:
+        if unknown:
+            print(f"Unknown helper(s): {', '.join(unknown)}")
+        print(f"Usage: python main.py HELPER [HELPER ...]  (helpers: {', '.join(HELPERS)})")
+        return 1
+    Supervisor(names).run()
+    return 0
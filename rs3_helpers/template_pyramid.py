@@ -0,0 +1,192 @@
+"""Pre-resized template bundles ("pyramids") for the scale search.
+
+For every template the build step writes ``<name>.pyramid.npz`` next to the
+PNG, holding the template already resized to every scale of the matcher range
+and converted to each representation the search scores in (BGR colour and
+Canny edges).  ``scale_search`` slices templates out of the bundle instead of
+calling ``cv2.resize`` for every scale of every search.
+
+Only the scale search reads bundles: once a template's scale is known, the
+matcher's own fixed-scale ``match()`` still resizes the template once per
+call.  Bundles are compressed, so they are decompressed into memory when a
+process first loads them rather than memory-mapped.
+
+Build (or refresh) all bundles under ``*/assets/`` with:
+
+    python -m rs3_helpers.template_pyramid [--force]
+
+A bundle whose PNG has changed since it was built is ignored, so a stale
+bundle only costs the on-the-fly resize it was meant to save.
+"""
+
+import argparse
+import glob
+import hashlib
+import os
+import threading
+
+import cv2
+import numpy as np
+
+PYRAMID_SUFFIX = '.pyramid.npz'
+MODES = ('color', 'canny')
+DEFAULT_CANNY_THRESHOLDS = (25, 50)
+
+# Loaded bundles by template path (None = no usable bundle, don't look again)
+_pyramids = {}
+_pyramids_lock = threading.Lock()
+
+
+def pyramid_path(template_path):
+    """Path of the bundle belonging to ``template_path``."""
+    return os.path.splitext(template_path)[0] + PYRAMID_SUFFIX
+
+
+def _file_sha1(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def resize_to_scale(template, scale):
+    """Resize ``template`` by ``scale`` the way the scale search does. None if it collapses."""
+    h, w = template.shape[:2]
+    scaled_w, scaled_h = int(round(w * scale)), int(round(h * scale))
+    if scaled_w < 1 or scaled_h < 1:
+        return None
+    interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+    return cv2.resize(template, (scaled_w, scaled_h), interpolation=interpolation)
+
+
+class TemplatePyramid:
+    """One template, pre-resized to a fixed list of scales, in every mode."""
+
+    def __init__(self, scales, shapes, offsets, planes, canny_thresholds):
+        self.scales = scales
+        self.shapes = shapes
+        self.offsets = offsets
+        self.planes = planes  # mode -> flat uint8 array
+        self.canny_thresholds = tuple(int(t) for t in canny_thresholds)
+        self._index = {round(float(s), 6): i for i, s in enumerate(scales)}
+
+    def get(self, scale, mode='color', canny_thresholds=DEFAULT_CANNY_THRESHOLDS):
+        """Return the template at ``scale`` in ``mode`` as a view, or None if the bundle lacks it."""
+        i = self._index.get(round(float(scale), 6))
+        if i is None or mode not in self.planes:
+            return None
+        if mode == 'canny' and tuple(canny_thresholds) != self.canny_thresholds:
+            return None
+        h, w = self.shapes[i]
+        if h == 0 or w == 0:
+            return None
+        start = self.offsets[mode][i]
+        channels = 3 if mode == 'color' else 1
+        plane = self.planes[mode][start:start + h * w * channels]
+        return plane.reshape((h, w, 3) if channels == 3 else (h, w))
+
+
+def build_pyramid(template_path, scales, canny_thresholds=DEFAULT_CANNY_THRESHOLDS):
+    """Write the bundle for ``template_path``. Returns the bundle path, or None on failure."""
+    template = cv2.imread(template_path, cv2.IMREAD_COLOR)
+    if template is None:
+        print(f"Error: Could not load template image from {template_path}")
+        return None
+
+    scales = np.asarray(scales, dtype=np.float64)
+    shapes = np.zeros((len(scales), 2), dtype=np.int32)
+    chunks = {mode: [] for mode in MODES}
+    offsets = {mode: np.zeros(len(scales), dtype=np.int64) for mode in MODES}
+    sizes = {mode: 0 for mode in MODES}
+
+    for i, scale in enumerate(scales):
+        resized = resize_to_scale(template, scale)
+        if resized is None:
+            for mode in MODES:
+                offsets[mode][i] = sizes[mode]
+            continue
+        shapes[i] = resized.shape[:2]
+        gray = cv2.cvtColor(resized, cv2.COLOR_BGR2GRAY)
+        planes = {
+            'color': resized,
+            'canny': cv2.Canny(gray, canny_thresholds[0], canny_thresholds[1]),
+        }
+        for mode in MODES:
+            offsets[mode][i] = sizes[mode]
+            chunks[mode].append(planes[mode].ravel())
+            sizes[mode] += planes[mode].size
+
+    out_path = pyramid_path(template_path)
+    np.savez_compressed(
+        out_path,
+        source_sha1=np.array(_file_sha1(template_path)),
+        scales=scales,
+        shapes=shapes,
+        canny_thresholds=np.array(canny_thresholds, dtype=np.int32),
+        **{f'{mode}_offsets': offsets[mode] for mode in MODES},
+        **{f'{mode}_plane': (np.concatenate(chunks[mode]) if chunks[mode] else np.zeros(0, np.uint8))
+           for mode in MODES},
+    )
+    with _pyramids_lock:
+        _pyramids.pop(template_path, None)
+    return out_path
+
+
+def _read_pyramid(template_path):
+    path = pyramid_path(template_path)
+    if not os.path.exists(path) or not os.path.exists(template_path):
+        return None
+    try:
+        with np.load(path) as data:
+            if str(data['source_sha1']) != _file_sha1(template_path):
+                print(f"Template pyramid {path} is stale. Rebuild it with 'python -m rs3_helpers.template_pyramid'.")
+                return None
+            return TemplatePyramid(
+                scales=data['scales'],
+                shapes=data['shapes'],
+                offsets={mode: data[f'{mode}_offsets'] for mode in MODES},
+                planes={mode: data[f'{mode}_plane'] for mode in MODES},
+                canny_thresholds=data['canny_thresholds'],
+            )
+    except Exception as e:
+        print(f"Error loading template pyramid {path}: {e}")
+        return None
+
+
+def load_pyramid(template_path):
+    """Return the (cached) bundle for ``template_path``, or None if there is no usable one."""
+    with _pyramids_lock:
+        if template_path not in _pyramids:
+            _pyramids[template_path] = _read_pyramid(template_path)
+        return _pyramids[template_path]
+
+
+def find_templates(root):
+    """All template PNGs under ``<root>/*/assets/``."""
+    return sorted(glob.glob(os.path.join(root, '*', 'assets', '*.png')))
+
+
+def main():
+    from rs3_helpers.scale_search import make_scales
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Build pre-resized template bundles for the scale search.")
+    parser.add_argument('templates', nargs='*', help="Template PNGs (default: every */assets/*.png)")
+    parser.add_argument('--force', action='store_true', help="Rebuild bundles that are already up to date")
+    args = parser.parse_args()
+
+    scales = make_scales()
+    templates = args.templates or find_templates(repo_root)
+    built = 0
+    for template_path in templates:
+        pyramid = load_pyramid(template_path)
+        if not args.force and pyramid is not None and np.array_equal(pyramid.scales, scales):
+            print(f"Up to date: {template_path}")
+            continue
+        out_path = build_pyramid(template_path, scales)
+        if out_path:
+            built += 1
+            print(f"Built {out_path} ({os.path.getsize(out_path) / 1024:.0f} KiB)")
+    print(f"Built {built} of {len(templates)} template pyramids.")
+
+
+if __name__ == '__main__':
+    main()
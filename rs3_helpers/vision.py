@@ -0,0 +1,162 @@
+"""Template lookup shared by all helpers.
+
+One ``find_image`` instead of a copy per helper, backed by:
+
+- shared matcher instances (``get_matcher``), created once per process so
+  their precomputation is reused by every caller;
+- one scale cache (``template_scales``) remembering the scale each template
+  was last detected at, bounded with LRU eviction so long sessions don't grow
+  it without limit;
+- the detection cascade (``rs3_helpers.cascade``), which rejects most
+  negatives before a colour matcher runs.
+"""
+
+from collections import OrderedDict
+import os
+import threading
+import time
+
+from template_matching import CannyEdgeMatcher, ColorMatcher
+
+from rs3_helpers.cascade import prefilter, record_matcher
+from rs3_helpers.scale_search import DEFAULT_MAX_SCALE, DEFAULT_MIN_SCALE, DEFAULT_NUM_SCALES, match_cold
+
+# Worker processes for the first (scale-unknown) search of a template. 0 = let the matcher scan serially.
+# Opt-in (e.g. os.cpu_count()): the workers come from a forkserver, which re-imports the script in each.
+SCALE_SEARCH_WORKERS = 0
+
+# Templates whose scale is remembered
+SCALE_CACHE_SIZE = 256
+
+CANNY_THRESHOLDS = (25, 50)
+
+# Run the cheap rejection stages before colour matchers (edge matchers don't use colour)
+USE_CASCADE = True
+
+# name -> (matcher class, keyword arguments)
+MATCHERS = {
+    'aggressive': (ColorMatcher, dict(match_threshold=0.90)),
+    'lenient': (ColorMatcher, dict(match_threshold=0.60)),
+    'canny': (CannyEdgeMatcher, dict(canny_low=CANNY_THRESHOLDS[0], canny_high=CANNY_THRESHOLDS[1],
+                                     match_threshold=0.1)),
+}
+
+
+class ScaleCache:
+    """Thread-safe template path -> scale mapping with LRU eviction."""
+
+    def __init__(self, max_size=SCALE_CACHE_SIZE):
+        self.max_size = max_size
+        self._scales = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, template_path, default=None):
+        with self._lock:
+            scale = self._scales.get(template_path)
+            if scale is None:
+                return default
+            self._scales.move_to_end(template_path)
+            return scale
+
+    def __getitem__(self, template_path):
+        scale = self.get(template_path)
+        if scale is None:
+            raise KeyError(template_path)
+        return scale
+
+    def __setitem__(self, template_path, scale):
+        with self._lock:
+            self._scales[template_path] = scale
+            self._scales.move_to_end(template_path)
+            while len(self._scales) > self.max_size:
+                self._scales.popitem(last=False)
+
+    def __contains__(self, template_path):
+        with self._lock:
+            return template_path in self._scales
+
+    def __len__(self):
+        with self._lock:
+            return len(self._scales)
+
+    def pop(self, template_path, default=None):
+        with self._lock:
+            return self._scales.pop(template_path, default)
+
+    def clear(self):
+        with self._lock:
+            self._scales.clear()
+
+
+template_scales = ScaleCache()
+
+_matchers = {}
+_matchers_lock = threading.Lock()
+
+
+def get_matcher(name):
+    """Shared matcher instance: 'aggressive' (0.90), 'lenient' (0.60) or 'canny'."""
+    with _matchers_lock:
+        matcher = _matchers.get(name)
+        if matcher is None:
+            matcher_class, kwargs = MATCHERS[name]
+            if matcher_class is ColorMatcher:
+                kwargs = dict(kwargs, num_scales=DEFAULT_NUM_SCALES, min_scale=DEFAULT_MIN_SCALE,
+                              max_scale=DEFAULT_MAX_SCALE)
+            matcher = matcher_class(**kwargs)
+            _matchers[name] = matcher
+        return matcher
+
+
+def find_image(template_path, screenshot, matcher=None, scale=None, first_hit=False, score=None):
+    """Find a template in a screenshot.
+
+    Uses the cached scale of the template if there is one, else ``scale``,
+    else searches for it.  ``first_hit`` is for presence checks: a cold search
+    stops at the first scale passing the matcher's threshold (colour matchers
+    only; the canny matcher always scans its own default scale range).  ``score`` is an
+    extra minimum correlation on top of the matcher's threshold.
+    Returns ``(result_img, bbox, scale, correlation, status)``; everything but
+    the status is None unless the template was detected.
+    """
+    if matcher is None:
+        matcher = get_matcher('aggressive')
+    if not os.path.exists(template_path):
+        print(f"Error: Template image not found at {template_path}")
+        return None, None, None, None, "Template not found"
+
+    cached_scale = template_scales.get(template_path)
+    use_cascade = USE_CASCADE and isinstance(matcher, ColorMatcher)
+    if use_cascade:
+        rejected_by = prefilter(template_path, screenshot, cached_scale or scale)
+        if rejected_by:
+            return None, None, None, None, f"Rejected ({rejected_by} stage)"
+
+    started = time.perf_counter()
+    if cached_scale is not None:
+        result_img, bbox, scale, correlation, status = matcher.match(
+            template_input=template_path, target_input=screenshot, scale=cached_scale
+        )
+    elif scale:
+        result_img, bbox, scale, correlation, status = matcher.match(
+            template_input=template_path, target_input=screenshot, scale=scale
+        )
+    elif isinstance(matcher, CannyEdgeMatcher):
+        # Scans its own default scale range, as before; search_scale would walk the colour matchers' range
+        result_img, bbox, scale, correlation, status = matcher.match(
+            template_input=template_path, target_input=screenshot
+        )
+    else:
+        result_img, bbox, scale, correlation, status = match_cold(
+            matcher, template_path, screenshot, workers=SCALE_SEARCH_WORKERS, first_hit=first_hit
+        )
+    if use_cascade:
+        record_matcher(status == 'Detected', started)
+
+    if status != 'Detected' or bbox is None or len(bbox) != 4:
+        return None, None, None, None, status
+    if score is not None and correlation < score:
+        return None, None, None, None, "Below score"
+    if cached_scale is None:
+        template_scales[template_path] = scale
+    return result_img, bbox, scale, correlation, status